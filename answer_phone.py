@@ -1,6 +1,10 @@
 import os
 import sys
-from flask import Flask, request
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 from twilio.twiml.voice_response import VoiceResponse
 from datetime import datetime
 from dotenv import load_dotenv
@@ -12,38 +16,105 @@ from crm import crm_manager
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), 'src', '.env'))
 
-app = Flask(__name__)
+# Configure logging (set LOG_LEVEL=INFO to see per-call CRM messages)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger("restaurant-phone")
 
-@app.route("/", methods=['GET', 'POST'])
-def answer_call():
-    """Respond to incoming phone calls with a brief message."""
-    # Get caller's phone number
-    caller_phone = request.values.get('From', 'Unknown')
-    
-    # Start our TwiML response
-    resp = VoiceResponse()
+# CRM writes are queued and flushed in batches by a background task
+CRM_BATCH_SIZE = int(os.getenv("CRM_BATCH_SIZE", "64"))
+CRM_FLUSH_INTERVAL = float(os.getenv("CRM_FLUSH_INTERVAL", "2.0"))
+_crm_queue: asyncio.Queue | None = None
+
+async def _flush_crm_batch(batch: list[dict]) -> None:
+    """Write one batch of queued call records to the CRM"""
+    result = await crm_manager.store_bulk(batch)
+    if result.get("success"):
+        logger.info("Stored %d phone calls in CRM", len(batch))
+    else:
+        logger.error("Failed to store phone calls in CRM: %s", result.get("error"))
+
+async def _crm_writer(queue: asyncio.Queue) -> None:
+    """
+    Collect queued call records and flush every CRM_BATCH_SIZE records or CRM_FLUSH_INTERVAL
+    seconds. A None record stops the writer after the batch in hand has been flushed.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        record = await queue.get()
+        if record is None:
+            return
+        batch = [record]
+        stopping = False
+        deadline = loop.time() + CRM_FLUSH_INTERVAL
+        while len(batch) < CRM_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                record = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if record is None:
+                stopping = True
+                break
+            batch.append(record)
+        try:
+            await _flush_crm_batch(batch)
+        except Exception as e:
+            logger.error("Failed to store phone calls in CRM: %s", e)
+        if stopping:
+            return
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _crm_queue
+    _crm_queue = asyncio.Queue(maxsize=10_000)
+    writer = asyncio.create_task(_crm_writer(_crm_queue))
+    try:
+        yield
+    finally:
+        # Stop the writer with a sentinel instead of cancelling it, so the batch it has
+        # already dequeued (or is writing) is flushed rather than lost
+        await _crm_queue.put(None)
+        await writer
+        # Flush anything queued behind the sentinel before shutting down
+        pending = []
+        while not _crm_queue.empty():
+            record = _crm_queue.get_nowait()
+            if record is not None:
+                pending.append(record)
+        if pending:
+            await _flush_crm_batch(pending)
+
+app = FastAPI(title="Restaurant Phone Webhook", lifespan=lifespan)
 
-    # Read a message aloud to the caller
-    resp.say("Thank you for calling our restaurant! We appreciate your call. Have a great day!", voice='Polly.Amy')
+# The greeting never varies per caller, so serialize the TwiML once at import
+_resp = VoiceResponse()
+_resp.say("Thank you for calling our restaurant! We appreciate your call. Have a great day!", voice='Polly.Amy')
+_TWIML = str(_resp).encode("utf-8")
+del _resp
 
-    # Store caller info in CRM as phone call
+@app.api_route("/", methods=["GET", "POST"])
+async def answer_call(request: Request):
+    """Respond to incoming phone calls with a brief message."""
+    # Get caller's phone number (Twilio sends form data on POST, query params on GET)
+    if request.method == "POST":
+        values = await request.form()
+    else:
+        values = request.query_params
+    caller_phone = values.get('From', 'Unknown')
+    
+    # Queue caller info for the CRM as phone call; the TwiML is returned immediately
     try:
-        # Use asyncio to run async function
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        loop.run_until_complete(crm_manager.store_customer_info(
-            phone=caller_phone,
-            interaction_summary="Incoming phone call answered"
-        ))
-        
-        loop.close()
-        print(f"Stored phone call from {caller_phone} in CRM")
-    except Exception as e:
-        print(f"Failed to store phone call in CRM: {str(e)}")
-
-    return str(resp)
+        _crm_queue.put_nowait({
+            "phone": caller_phone,
+            "interaction_summary": "Incoming phone call answered"
+        })
+    except asyncio.QueueFull:
+        logger.error("CRM queue full, dropping phone call record from %s", caller_phone)
+
+    return Response(content=_TWIML, media_type="application/xml")
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run("answer_phone:app", host="0.0.0.0", port=5000, reload=True)
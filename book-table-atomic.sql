@@ -0,0 +1,47 @@
+-- Atomic capacity check + insert for table bookings
+-- Run this in your Supabase SQL Editor; the book_table tool calls it via supabase.rpc()
+
+-- One round trip per booking: the slot is locked, checked against capacity and
+-- inserted into in a single transaction, so two concurrent bookings can no longer
+-- both pass the capacity check for the same slot.
+CREATE OR REPLACE FUNCTION book_table_atomic(
+    p_date date,
+    p_time text,
+    p_party_size int,
+    p_name text,
+    p_phone text,
+    p_max_tables int,
+    p_max_capacity int
+) RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_guests int;
+    v_tables int;
+    v_id bookings.id%TYPE;
+BEGIN
+    -- Serialize bookings for the same slot (row locks cannot be taken with aggregates)
+    PERFORM pg_advisory_xact_lock(hashtext('bookings:' || p_date::text || ' ' || p_time::time::text));
+
+    -- bookings.time is a time column (normalize-booking-times.sql), so this uses bookings_date_time_idx
+    SELECT COALESCE(SUM(guests), 0), COUNT(*)
+      INTO v_guests, v_tables
+      FROM bookings
+     WHERE date = p_date
+       AND time = p_time::time;
+
+    IF v_guests + p_party_size > p_max_capacity OR v_tables >= p_max_tables THEN
+        RETURN jsonb_build_object(
+            'available', false,
+            'guests_booked', v_guests,
+            'tables_booked', v_tables
+        );
+    END IF;
+
+    INSERT INTO bookings (name, date, time, guests, phone)
+    VALUES (p_name, p_date, p_time::time, p_party_size, NULLIF(p_phone, ''))
+    RETURNING id INTO v_id;
+
+    RETURN jsonb_build_object('available', true, 'id', v_id);
+END;
+$$;
@@ -0,0 +1,69 @@
+-- Server-side capacity enforcement for bookings
+-- Run this in your Supabase SQL Editor after normalize-booking-times.sql
+
+-- book_table_atomic already checks capacity before inserting, but other writers (the web
+-- frontend, modify_reservation) insert or move bookings directly. This trigger makes the
+-- limits hold for every write path.
+
+-- Single-row limits table read by the trigger. Set the values below to the MAX_TABLES /
+-- MAX_CAPACITY_PER_TIME_SLOT the app is deployed with, and re-run this statement (or
+-- update the row with the service role) whenever those settings change.
+CREATE TABLE IF NOT EXISTS booking_limits (
+    id boolean PRIMARY KEY DEFAULT true CHECK (id),
+    max_tables int NOT NULL DEFAULT 10,
+    max_capacity int NOT NULL DEFAULT 50,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO booking_limits (id, max_tables, max_capacity) VALUES (true, 10, 50)
+ON CONFLICT (id) DO UPDATE
+   SET max_tables = EXCLUDED.max_tables,
+       max_capacity = EXCLUDED.max_capacity,
+       updated_at = now();
+
+-- Clients may read the limits (the trigger runs as the writing role) but never change
+-- them; with no write policy, only the service role can update the row
+ALTER TABLE booking_limits ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Public access to booking limits" ON booking_limits;
+DROP POLICY IF EXISTS "Public read access to booking limits" ON booking_limits;
+CREATE POLICY "Public read access to booking limits" ON booking_limits
+    FOR SELECT USING (true);
+
+CREATE OR REPLACE FUNCTION enforce_booking_capacity() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    max_tables int;
+    max_capacity int;
+    v_guests int;
+    v_tables int;
+BEGIN
+    SELECT l.max_tables, l.max_capacity
+      INTO max_tables, max_capacity
+      FROM booking_limits l
+     WHERE l.id;
+    -- Fall back to the application defaults if the limits row was deleted
+    max_tables := COALESCE(max_tables, 10);
+    max_capacity := COALESCE(max_capacity, 50);
+
+    -- Same lock key as book_table_atomic, so concurrent writers to a slot serialize
+    PERFORM pg_advisory_xact_lock(hashtext('bookings:' || NEW.date::text || ' ' || NEW.time::text));
+
+    SELECT COALESCE(SUM(guests), 0), COUNT(*)
+      INTO v_guests, v_tables
+      FROM bookings
+     WHERE date = NEW.date
+       AND time = NEW.time
+       AND (TG_OP = 'INSERT' OR id <> NEW.id);
+
+    IF v_guests + NEW.guests > max_capacity OR v_tables >= max_tables THEN
+        RAISE EXCEPTION 'CAPACITY_EXCEEDED: % guests and % tables already booked', v_guests, v_tables;
+    END IF;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bookings_enforce_capacity ON bookings;
+CREATE TRIGGER bookings_enforce_capacity
+    BEFORE INSERT OR UPDATE OF date, time, guests ON bookings
+    FOR EACH ROW EXECUTE FUNCTION enforce_booking_capacity();
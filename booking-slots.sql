@@ -0,0 +1,50 @@
+-- Pre-aggregated per-slot booking totals
+-- Run this in your Supabase SQL Editor after normalize-booking-times.sql
+
+-- Availability lookups only need guest and table totals per (date, time). A materialized
+-- view would need a full refresh on every booking, so the totals live in a regular table
+-- kept up to date by a row trigger on bookings.
+CREATE TABLE IF NOT EXISTS booking_slots (
+    date date NOT NULL,
+    time time NOT NULL,
+    guests_sum int NOT NULL DEFAULT 0,
+    table_count int NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, time)
+);
+
+CREATE OR REPLACE FUNCTION maintain_booking_slots() RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE booking_slots
+           SET guests_sum = guests_sum - OLD.guests,
+               table_count = table_count - 1
+         WHERE date = OLD.date AND time = OLD.time;
+        DELETE FROM booking_slots
+         WHERE date = OLD.date AND time = OLD.time AND table_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO booking_slots (date, time, guests_sum, table_count)
+        VALUES (NEW.date, NEW.time, NEW.guests, 1)
+        ON CONFLICT (date, time) DO UPDATE
+           SET guests_sum = booking_slots.guests_sum + EXCLUDED.guests_sum,
+               table_count = booking_slots.table_count + 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bookings_maintain_slots ON bookings;
+CREATE TRIGGER bookings_maintain_slots
+    AFTER INSERT OR UPDATE OF date, time, guests OR DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION maintain_booking_slots();
+
+-- Backfill from existing bookings
+TRUNCATE booking_slots;
+INSERT INTO booking_slots (date, time, guests_sum, table_count)
+SELECT date, time, SUM(guests), COUNT(*)
+  FROM bookings
+ GROUP BY date, time;
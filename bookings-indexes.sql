@@ -0,0 +1,8 @@
+-- Indexes for the bookings table
+-- Run this in your Supabase SQL Editor as a single statement
+-- (CREATE INDEX CONCURRENTLY cannot run inside a transaction block)
+
+-- Availability checks filter by date and time and only read guests, so including
+-- guests makes the index covering: slot aggregates never touch the table heap
+CREATE INDEX CONCURRENTLY IF NOT EXISTS bookings_date_time_idx
+    ON bookings (date, time) INCLUDE (guests);
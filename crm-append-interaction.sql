@@ -0,0 +1,35 @@
+-- Server-side append for CRM interaction history
+-- Run this in your Supabase SQL Editor
+
+-- update_customer used to read last_interaction, concatenate in Python and write the whole
+-- history back. This appends the new line in a single UPDATE, whatever the history size.
+CREATE OR REPLACE FUNCTION append_interaction(
+    p_phone text,
+    p_line text,
+    p_name text DEFAULT NULL
+) RETURNS SETOF crm_contacts
+LANGUAGE sql
+AS $$
+    UPDATE crm_contacts
+       SET last_interaction = COALESCE(last_interaction || E'\n', '') || p_line,
+           name = COALESCE(p_name, name),
+           updated_at = now()
+     WHERE phone = p_phone
+    RETURNING *;
+$$;
+
+-- Batch variant used by CRMManager.store_bulk (phone webhook). p_entries is a JSON array of
+-- {"phone", "name", "line"} objects, at most one per phone. New contacts are inserted and
+-- existing histories are appended to in the same statement, without reading them first.
+CREATE OR REPLACE FUNCTION append_interactions(p_entries jsonb) RETURNS SETOF crm_contacts
+LANGUAGE sql
+AS $$
+    INSERT INTO crm_contacts AS c (phone, name, last_interaction, created_at, updated_at)
+    SELECT e->>'phone', e->>'name', e->>'line', now(), now()
+      FROM jsonb_array_elements(p_entries) AS e
+    ON CONFLICT (phone) DO UPDATE
+       SET last_interaction = COALESCE(c.last_interaction || E'\n', '') || EXCLUDED.last_interaction,
+           name = COALESCE(EXCLUDED.name, c.name),
+           updated_at = now()
+    RETURNING c.*;
+$$;
@@ -0,0 +1,12 @@
+-- Trigram indexes for CRM customer search
+-- Run this in your Supabase SQL Editor
+
+-- search_customers filters with name/phone ILIKE '%query%'. A leading wildcard cannot
+-- use a btree index, but pg_trgm GIN indexes serve it as an index scan.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS crm_contacts_name_trgm_idx
+    ON crm_contacts USING gin (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS crm_contacts_phone_trgm_idx
+    ON crm_contacts USING gin (phone gin_trgm_ops);
@@ -1,6 +1,8 @@
 # Download the helper library from https://www.twilio.com/docs/python/install
 import os
+import asyncio
 from twilio.rest import Client
+from twilio.http.async_http_client import AsyncTwilioHttpClient
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file in the src directory
@@ -10,12 +12,26 @@ load_dotenv(os.path.join(os.path.dirname(__file__), 'src', '.env'))
 # and set the environment variables. See http://twil.io/secure
 account_sid = os.environ["TWILIO_ACCOUNT_SID"]
 auth_token = os.environ["TWILIO_AUTH_TOKEN"]
-client = Client(account_sid, auth_token)
 
-call = client.calls.create(
-    url="http://demo.twilio.com/docs/voice.xml",
-    to="+212644568886",
-    from_="+12518620918",
-)
+TWIML_URL = "http://demo.twilio.com/docs/voice.xml"
+FROM_NUMBER = "+12518620918"
 
-print(call.sid)
\ No newline at end of file
+async def place_call(client: Client, to: str, url: str = TWIML_URL, from_: str = FROM_NUMBER):
+    """Place a single outbound call using the shared client"""
+    return await client.calls.create_async(url=url, to=to, from_=from_)
+
+async def place_calls(client: Client, numbers: list[str]) -> list:
+    """Place several outbound calls concurrently over the shared session"""
+    return await asyncio.gather(*[place_call(client, number) for number in numbers])
+
+async def main():
+    # One client backed by a pooled async HTTP session, so every call reuses the same
+    # TCP/TLS connection; the aiohttp session needs a running loop, so it is created here
+    async with AsyncTwilioHttpClient() as http_client:
+        client = Client(account_sid, auth_token, http_client=http_client)
+        calls = await place_calls(client, ["+212644568886"])
+        for call in calls:
+            print(call.sid)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,15 @@
+-- Normalize bookings.date and bookings.time to proper date and time columns
+-- Run this in your Supabase SQL Editor before book-table-atomic.sql
+
+-- Past writes mixed 'HH:MM' and 'HH:MM:SS' text values, which forced every reader to
+-- query both formats and de-duplicate. As a time column, '19:00' and '19:00:00' are the
+-- same value, so a single equality filter matches every booking for a slot.
+-- (The USING cast is a no-op if the column already has type time.)
+ALTER TABLE bookings
+    ALTER COLUMN time TYPE time USING left(time::text, 5)::time;
+
+-- Filters and the (date, time) index then compare native dates instead of text, and
+-- the date parameters of book_table_atomic and the booking_slots trigger match exactly.
+-- (Stored values are already YYYY-MM-DD, so the cast is lossless.)
+ALTER TABLE bookings
+    ALTER COLUMN date TYPE date USING date::date;
@@ -5,6 +5,7 @@ Startup script for the Restaurant Voice Agent with LiveKit integration.
 This script helps you run the restaurant voice agent with proper environment setup.
 """
 
+import logging
 import os
 import sys
 from pathlib import Path
@@ -16,10 +17,36 @@ sys.path.insert(0, str(src_path))
 # Change to src directory for relative imports
 os.chdir(str(src_path))
 
+# Flush log output immediately in worker processes
+os.environ.setdefault("PYTHONUNBUFFERED", "1")
+
+logger = logging.getLogger("restaurant-voice-agent")
+
+def prewarm(proc) -> None:
+    """Warm heavy imports and the RAG path in each worker process before it takes calls."""
+    import src.voice  # loads LangChain, tools and vectorstores
+
+    # The entrypoint reads the VAD from proc.userdata; skipped for the launcher's own warmup (proc=None)
+    if proc is not None:
+        src.voice.prewarm(proc)
+
+    try:
+        from tools.faq import restaurant_faq
+        from tools.menu_search import menu_search
+
+        # Dummy lookups initialize the embedding client and Chroma query path
+        restaurant_faq.invoke({"question": "warmup"})
+        menu_search.invoke({"query": "warmup"})
+    except Exception as e:
+        logger.warning("Prewarm failed: %s", e, exc_info=True)
+
 if __name__ == "__main__":
     from livekit.agents import cli, WorkerOptions
     from src.voice import entrypoint
     
+    print("[WARMUP] Preloading tools...")
+    prewarm(None)
+    
     print("[START] Starting Restaurant Voice Agent with LiveKit...")
     print("[INFO] Agent capabilities:")
     print("  • Menu search and recommendations")
@@ -30,7 +57,7 @@ if __name__ == "__main__":
     print("=" * 60)
     
     try:
-        cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+        cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
     except KeyboardInterrupt:
         print("\n👋 Restaurant Voice Agent stopped by user.")
     except Exception as e:
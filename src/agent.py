@@ -1,35 +1,104 @@
 import os
 import re
+import time
+import asyncio
+import logging
+from typing import AsyncIterator
+from functools import lru_cache
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
 
+# Prefer Google RE2 (linear-time DFA matching) for the booking extractors when installed
+try:
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
+# Optional Hyperscan multi-pattern prefilter for the booking extractors
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 # Import the custom tools (package-relative)
 from .tools.faq import restaurant_faq
-from .tools.book_table import book_table
+from .tools.book_table import BOOKING_CONFIRMED, book_table
 from .tools.modify_reservation import modify_reservation
 from .tools.cancel_reservation import cancel_reservation, view_reservation
 from .tools.check_availability import check_table_availability
 from .tools.menu_search import menu_search
+from .semantic_cache import semantic_cache
 
 # Load environment variables
 load_dotenv()
 
-# Create the LLM with OpenAI API
-llm = ChatOpenAI(
-    model="gpt-4o-mini",  # Use GPT-4o-mini for better tool calling
-    temperature=0.1,  # Lower temperature for more consistent responses
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
+logger = logging.getLogger("restaurant-agent")
+logger.addHandler(logging.NullHandler())
+
+# Cache LLM responses so identical prompts skip the OpenAI round-trip
+set_llm_cache(SQLiteCache(database_path=os.getenv("LLM_CACHE_PATH", ".langchain.db")))
+
+@lru_cache(maxsize=1)
+def get_llm() -> ChatOpenAI:
+    """Create the OpenAI chat model on first use (one client per process)."""
+    return ChatOpenAI(
+        model="gpt-4o-mini",  # Use GPT-4o-mini for better tool calling
+        temperature=0.1,  # Lower temperature for more consistent responses
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
 
 # Directly use the custom tools instead of load_tools
 tools = [book_table, modify_reservation, cancel_reservation, view_reservation, check_table_availability, restaurant_faq, menu_search]
 
-print(f"Available tools: {[tool.name for tool in tools]}")
+def _build_checkpointer():
+    """
+    Create the conversation checkpointer selected by CHECKPOINT_BACKEND.
+    
+    - memory (default): in-process MemorySaver
+    - sqlite: local SqliteSaver at CHECKPOINT_DB_PATH
+    - postgres: PostgresSaver at CHECKPOINT_DB_URL, shared by all workers
+    - redis: RedisSaver at REDIS_URL, shared by all workers
+    """
+    backend = os.getenv("CHECKPOINT_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        import sqlite3
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        conn = sqlite3.connect(os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db"), check_same_thread=False)
+        return SqliteSaver(conn)
+    if backend == "postgres":
+        from psycopg_pool import ConnectionPool
+        from langgraph.checkpoint.postgres import PostgresSaver
+        pool = ConnectionPool(
+            os.environ["CHECKPOINT_DB_URL"],
+            kwargs={"autocommit": True, "prepare_threshold": 0},
+        )
+        saver = PostgresSaver(pool)
+        saver.setup()
+        return saver
+    if backend == "redis":
+        from langgraph.checkpoint.redis import RedisSaver
+        saver = RedisSaver(redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"))
+        saver.setup()
+        return saver
+    return MemorySaver()
+
+# Create checkpointer for conversation history
+memory = _build_checkpointer()
+
+# The SQLite/Postgres/Redis savers are sync-only, so async turns run the graph in a worker thread
+CHECKPOINTER_SUPPORTS_ASYNC = isinstance(memory, MemorySaver)
 
-# Create memory saver for conversation history
-memory = MemorySaver()
+# Threads idle for longer than this are evicted from the checkpointer
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", "3600"))
+CHECKPOINT_SWEEP_INTERVAL = 300
+thread_activity: dict[str, float] = {}
+_last_sweep = time.monotonic()
 
 # Define system prompt for the agent
 system_prompt = """You are a professional restaurant assistant AI helping customers with reservations, menu inquiries, and general questions about our restaurant.
@@ -43,86 +112,252 @@ IMPORTANT: When handling reservations, carefully review the conversation history
 
 Be efficient and avoid repetitive questions."""
 
-# Create ReAct agent with memory
-agent = create_react_agent(
-    model=llm,
-    tools=tools,
-    checkpointer=memory
-)
+SYSTEM_MESSAGE = SystemMessage(content=system_prompt)
+
+def _build_prompt(state: dict, config: dict) -> list:
+    """
+    Assemble the model input for one LLM call: the static system prompt, the thread
+    history, and the current booking summary (if any). The summary is passed through
+    the run config rather than the input messages so it is not checkpointed every turn.
+    """
+    messages = [SYSTEM_MESSAGE, *state["messages"]]
+    booking_summary = config.get("configurable", {}).get("booking_summary")
+    if booking_summary:
+        messages.append(SystemMessage(content=booking_summary))
+    return messages
 
-# Track which threads have received the system prompt
-seen_threads = set()
+@lru_cache(maxsize=1)
+def get_agent():
+    """Build and compile the ReAct agent graph on first use, then reuse it."""
+    return create_react_agent(
+        model=get_llm(),
+        tools=tools,
+        # System prompts are applied per LLM call and never written to the thread history
+        prompt=_build_prompt,
+        checkpointer=memory
+    )
 
 # Lightweight per-thread slot tracker (process-local)
-# Stores what booking details we've already extracted from user messages
-booking_state: dict[str, dict[str, str]] = {}
+# Stores what booking details we've already extracted from user messages.
+# Bounded with a TTL so abandoned sessions are evicted instead of growing forever.
+booking_state: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
 
 # Regex patterns to extract booking information
-NAME_PATTERNS = [
-    re.compile(r"(?:my name is|i am|i'm|this is|call me|name'?s?)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)", re.I),
-    re.compile(r"^([A-Z][a-z]+)(?:\s+for\s+\d+)?$", re.I),  # Just a name like "dan" or "Dan for 5"
-]
-DATE_PATTERNS = [
-    re.compile(r"\b(today|tomorrow|tonight)\b", re.I),
-    re.compile(r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", re.I),
-    re.compile(r"\b(\d{4}-\d{1,2}-\d{1,2})\b"),               # 2025-10-21
-    re.compile(r"\b(\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b"),        # 10/21 or 10/21/2025
-    re.compile(r"\b(next\s+(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday))\b", re.I),
-]
-TIME_PATTERNS = [
-    re.compile(r"\b(\d{1,2}:\d{2}\s?(?:am|pm)?)\b", re.I),    # 7:30 pm
-    re.compile(r"\b(\d{1,2}\s?(?:am|pm))\b", re.I),            # 7 pm or 8pm
-    re.compile(r"\bat\s+(\d{1,2}(?::\d{2})?\s?(?:am|pm)?)\b", re.I),
-]
-PARTY_PATTERNS = [
-    re.compile(r"\bfor\s+(\d+)\s+(?:people|guests|persons|ppl)?\b", re.I),
-    re.compile(r"\b(\d+)\s+(?:people|guests|persons|ppl)\b", re.I),
-    re.compile(r"\bparty\s+of\s+(\d+)\b", re.I),
-]
-PHONE_PATTERNS = [
-    re.compile(r"\b(\+?\d[\d\-\s]{7,}\d)\b"),
-]
+# Every alternative captures its value into a named group "<field>__<variant>"; all of them are
+# fused into ONE compiled pattern so a single finditer pass fills every field
+# (all patterns stay within the RE2 subset: no lookarounds or backreferences)
+BOOKING_ALTERNATIVES = (
+    r"(?:my name is|i am|i'm|this is|call me|name'?s?)\s+(?P<name__intro>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
+    r"^(?P<name__bare>[A-Z][a-z]+)(?:\s+for\s+\d+)?$",              # Just a name like "dan" or "Dan for 5"
+    r"\b(?P<date__iso>\d{4}-\d{1,2}-\d{1,2})\b",                     # 2025-10-21
+    r"\b(?P<date__us>\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b",               # 10/21 or 10/21/2025
+    r"\b(?P<time__clock>\d{1,2}:\d{2}\s?(?:am|pm)?)\b",              # 7:30 pm
+    r"\b(?P<time__meridiem>\d{1,2}\s?(?:am|pm))\b",                  # 7 pm or 8pm
+    r"\bat\s+(?P<time__at>\d{1,2}(?::\d{2})?\s?(?:am|pm)?)\b",
+    r"\bfor\s+(?P<party_size__for>\d+)\s+(?:people|guests|persons|ppl)?\b",
+    r"\b(?P<party_size__count>\d+)\s+(?:people|guests|persons|ppl)\b",
+    r"\bparty\s+of\s+(?P<party_size__party_of>\d+)\b",
+    r"\b(?P<phone__number>\+?\d[\d\-\s]{7,}\d)\b",
+)
+# Inline (?i) instead of a flags argument: re2.compile takes an Options object and has no re2.I
+BOOKING_PATTERN = regex_engine.compile("(?i)" + "|".join(BOOKING_ALTERNATIVES))
+
+# Every quantifier above is bounded or followed by a disjoint token, so the stdlib
+# fallback stays near-linear; capping the scanned length bounds the worst case anyway
+MAX_EXTRACT_CHARS = 1000
+
+# Keyword dates ("tomorrow", "friday", "next friday") are matched by token lookup
+# instead of regex alternation; only numeric dates stay in BOOKING_PATTERN
+DATE_KEYWORDS = frozenset({"today", "tomorrow", "tonight"})
+WEEKDAYS = frozenset({"monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"})
+_TOKEN_SPLIT = re.compile(r"\W+")
+
+def _scan_date_keywords(text: str) -> str | None:
+    """Return the first keyword date in the text ("next friday", "tomorrow", ...), if any."""
+    tokens = _TOKEN_SPLIT.split(text.lower())
+    for i, token in enumerate(tokens):
+        if token in DATE_KEYWORDS:
+            return token
+        if token == "next" and i + 1 < len(tokens) and tokens[i + 1] in WEEKDAYS:
+            return f"next {tokens[i + 1]}"
+        if token in WEEKDAYS:
+            return token
+    return None
+
+def _build_field_scanner():
+    """
+    Compile every alternative into one Hyperscan database so a single pass over the
+    text tells whether any booking field can match. Hyperscan does not return capture
+    groups, so it is only used to skip the regex pass on texts with no booking details.
+    """
+    if hyperscan is None:
+        return None
+    try:
+        expressions = [re.sub(r"\(\?P<\w+>", "(", body).encode("utf-8") for body in BOOKING_ALTERNATIVES]
+        flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_PREFILTER
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        db.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[flags] * len(expressions),
+        )
+        return db
+    except Exception as e:
+        logger.warning("Hyperscan unavailable for booking extraction: %s", e)
+        return None
+
+_field_scanner = _build_field_scanner()
+
+def _may_contain_booking_fields(text: str) -> bool:
+    """Return False only when the Hyperscan pass proved no booking field can match."""
+    if _field_scanner is None:
+        return True
+    found: list[int] = []
+    def on_match(pattern_id, start, end, flags, context):
+        found.append(pattern_id)
+        return True  # one hit is enough - stop scanning
+    try:
+        _field_scanner.scan(text.encode("utf-8"), match_event_handler=on_match)
+    except Exception:
+        # Raised when the handler halts the scan (a hit) or on a scan error - either way, run the regex pass
+        return True
+    return bool(found)
+
+# COMMAND-class intents (book/modify/cancel) are never served from the semantic cache
+COMMAND_PATTERN = re.compile(r"\b(book\w*|reserv\w*|modify|change|cancel\w*)\b", re.I)
+
+# Cheap guard: slot extraction only runs when a turn plausibly concerns a booking
+# (any digit covers times, dates, party sizes and phone numbers)
+BOOKING_HINT_PATTERN = re.compile(
+    r"\d|\b(book\w*|reserv\w*|table|seat\w*|dinner|lunch|brunch|breakfast|party|people|guests"
+    r"|today|tonight|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+    r"|name|i am|i'm|this is|call me)\b",
+    re.I,
+)
+
+# Last user turn per thread, used as the semantic cache context key
+last_user_turn: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Trivial turns answered without invoking the LLM
+GREETING_RESPONSES = {
+    "hi": "Hi there! How can I help you today? I can book a table, check availability, or answer questions about our menu and restaurant.",
+    "hello": "Hello! How can I help you today? I can book a table, check availability, or answer questions about our menu and restaurant.",
+    "hey": "Hey! How can I help you today? I can book a table, check availability, or answer questions about our menu and restaurant.",
+    "good morning": "Good morning! How can I help you today?",
+    "good afternoon": "Good afternoon! How can I help you today?",
+    "good evening": "Good evening! How can I help you today?",
+    "thanks": "You're welcome! Is there anything else I can help you with?",
+    "thank you": "You're welcome! Is there anything else I can help you with?",
+}
+AFFIRMATIONS = frozenset({"yes", "yes please", "yep", "yeah", "confirm", "go ahead", "book it", "sounds good"})
+REQUIRED_BOOKING_FIELDS = ("name", "date", "time", "party_size")
+
+# REPL commands that end the interactive session
+EXIT_COMMANDS = frozenset({"quit", "exit", "bye", "goodbye"})
+
+# Keyword lexicon for questions the FAQ document answers on its own
+FAQ_PATTERN = re.compile(
+    r"\b(hours?|opening|open|closing|close|location|address|where are you|directions|parking|park"
+    r"|dress code|attire|payment|pay|credit cards?|cash|tip|tipping|gratuity|contact|email"
+    r"|wifi|wi-fi|wheelchair|accessib\w*|pets?|dogs?|corkage|private dining|events?|catering)\b",
+    re.I,
+)
+
+def classify_intent(text: str) -> str:
+    """
+    Cheap keyword classifier used to gate the full agent.
+    
+    Returns:
+        str: One of "greeting", "booking", "faq" or "other".
+    """
+    norm = text.strip().lower().rstrip("!.?")
+    if norm in GREETING_RESPONSES:
+        return "greeting"
+    if COMMAND_PATTERN.search(text) or (BOOKING_HINT_PATTERN.search(text) and extract_booking_info(text)):
+        return "booking"
+    if FAQ_PATTERN.search(text):
+        return "faq"
+    return "other"
+
+def _record_direct_turn(thread_id: str, input_text: str, response: str) -> None:
+    """
+    Append a turn answered outside the agent to its LangGraph thread, so the history
+    does not still end with the agent's "shall I book?" question (which could make a
+    later agent turn call book_table again).
+    """
+    try:
+        get_agent().update_state(
+            {"configurable": {"thread_id": thread_id}},
+            {"messages": [HumanMessage(content=input_text), AIMessage(content=response)]},
+            as_node="agent",
+        )
+    except Exception as e:
+        logger.warning("Failed to record direct booking turn for %s: %s", thread_id, e)
+
+def answer_directly(input_text: str, thread_id: str) -> str | None:
+    """
+    Answer trivial turns (empty input, greetings, confirming a complete booking)
+    without running the ReAct loop. Returns None when the agent is needed.
+    """
+    norm = input_text.strip().lower().rstrip("!.?")
+    state = booking_state.get(thread_id, {})
+    
+    if not norm:
+        return "How can I help?"
+    
+    if norm in GREETING_RESPONSES and not state:
+        return GREETING_RESPONSES[norm]
+    
+    # All booking slots collected and the customer confirmed - book directly
+    if norm in AFFIRMATIONS and all(state.get(k) for k in REQUIRED_BOOKING_FIELDS):
+        booking_data = {k: state[k] for k in REQUIRED_BOOKING_FIELDS}
+        if not booking_data["party_size"].isdigit():
+            return None
+        booking_data["party_size"] = int(booking_data["party_size"])
+        if state.get("phone"):
+            booking_data["phone"] = state["phone"]
+        result = book_table.invoke(booking_data)
+        # Let the agent handle anything the tool rejected (e.g. "7 pm" instead of HH:MM)
+        if result.startswith("Error"):
+            return None
+        _record_direct_turn(thread_id, input_text, result)
+        # Keep the collected details when the slot was full, so the customer can pick another time
+        if result.startswith(BOOKING_CONFIRMED):
+            booking_state.pop(thread_id, None)
+        return result
+    
+    return None
+
+# Short conversational replies that carry no booking details (and must not be read as a bare name)
+NON_BOOKING_REPLIES = frozenset({"ok", "okay", "no", "nope", "sure", "great", "cool"}) | AFFIRMATIONS | GREETING_RESPONSES.keys()
 
 def extract_booking_info(text: str) -> dict[str, str]:
     """Extract booking information from user text using regex patterns."""
     info: dict[str, str] = {}
+    if len(text) < 2 or text.strip().lower().rstrip("!.?") in NON_BOOKING_REPLIES:
+        return info
+    text = text[:MAX_EXTRACT_CHARS]
     
-    # Extract name
-    for pat in NAME_PATTERNS:
-        m = pat.search(text)
-        if m:
-            info["name"] = m.group(1).strip().title()
-            break
-    
-    # Extract date
-    for pat in DATE_PATTERNS:
-        m = pat.search(text)
-        if m:
-            info["date"] = m.group(1).strip()
-            break
-    
-    # Extract time
-    for pat in TIME_PATTERNS:
-        m = pat.search(text)
-        if m:
-            val = m.group(1).strip()
-            # Clean up "at " prefix if present
-            info["time"] = re.sub(r"^at\s+", "", val, flags=re.I)
-            break
+    date = _scan_date_keywords(text)
+    if date:
+        info["date"] = date
     
-    # Extract party size
-    for pat in PARTY_PATTERNS:
-        m = pat.search(text)
-        if m:
-            info["party_size"] = m.group(1).strip()
-            break
+    if not _may_contain_booking_fields(text):
+        return info
     
-    # Extract phone
-    for pat in PHONE_PATTERNS:
-        m = pat.search(text)
-        if m:
-            info["phone"] = m.group(1).strip()
-            break
+    # One pass over the text; the first match for each field wins
+    for m in BOOKING_PATTERN.finditer(text):
+        # groupdict() is supported by both re and re2 (lastgroup is not portable)
+        tag, value = next((k, v) for k, v in m.groupdict().items() if v)
+        field_name = tag.split("__", 1)[0]
+        if field_name in info:
+            continue
+        value = value.strip()
+        if field_name == "name":
+            value = value.title()
+        # Times need no clean-up: the "at" alternative matches "at " outside its group
+        info[field_name] = value
     
     return info
 
@@ -155,6 +390,125 @@ def summarize_booking_info(info: dict[str, str]) -> str:
 
 
 
+def prune_stale_threads(now: float | None = None) -> int:
+    """Delete checkpoints and per-thread state for threads idle past CHECKPOINT_TTL_SECONDS."""
+    now = time.monotonic() if now is None else now
+    stale = [t for t, seen in list(thread_activity.items()) if now - seen > CHECKPOINT_TTL_SECONDS]
+    for stale_thread in stale:
+        try:
+            memory.delete_thread(stale_thread)
+        except Exception as e:
+            logger.warning("Failed to evict checkpoints for %s: %s", stale_thread, e)
+        thread_activity.pop(stale_thread, None)
+        booking_state.pop(stale_thread, None)
+        last_user_turn.pop(stale_thread, None)
+    if stale:
+        logger.info("Evicted %d stale conversation threads", len(stale))
+    return len(stale)
+
+def _touch_thread(thread_id: str) -> None:
+    """Record thread activity and periodically sweep stale threads."""
+    global _last_sweep
+    now = time.monotonic()
+    thread_activity[thread_id] = now
+    if now - _last_sweep > CHECKPOINT_SWEEP_INTERVAL:
+        _last_sweep = now
+        prune_stale_threads(now)
+
+def _prepare_turn(input_text: str, thread_id: str) -> tuple[str | None, list, bool, str | None]:
+    """
+    Shared per-turn preprocessing for run_agent/arun_agent.
+    
+    Returns:
+        tuple: (early_response, messages, cacheable, previous_turn). When early_response
+        is not None the turn was answered without the agent.
+    """
+    logger.debug("Processing query: %s", input_text)
+    _touch_thread(thread_id)
+    
+    # Skip the LLM entirely for trivial turns
+    direct_response = answer_directly(input_text, thread_id)
+    if direct_response is not None:
+        return direct_response, [], False, None
+    
+    previous_turn = last_user_turn.get(thread_id)
+    last_user_turn[thread_id] = input_text
+    
+    # Maintain per-thread booking state. Extraction is skipped for turns that are clearly
+    # not about a booking, unless a booking is already in progress or the previous turn
+    # started one (e.g. a bare name given in reply to "what name is it under?").
+    state = booking_state.get(thread_id, {})
+    should_extract = (
+        state
+        or BOOKING_HINT_PATTERN.search(input_text)
+        or (previous_turn and BOOKING_HINT_PATTERN.search(previous_turn))
+    )
+    updates = extract_booking_info(input_text) if should_extract else {}
+    if updates:
+        state.update({k: v for k, v in updates.items() if v})
+        booking_state[thread_id] = state
+        logger.debug("extracted updates for %s: %s", thread_id, updates)
+    logger.debug("booking_state for %s: %s", thread_id, state)
+    
+    # Serve informational turns from the semantic cache when possible
+    cacheable = not state and not COMMAND_PATTERN.search(input_text)
+    if cacheable:
+        cached_response = semantic_cache.lookup(input_text, previous_turn)
+        if cached_response:
+            return cached_response, [], False, None
+        
+        # Plain FAQ questions go straight to the FAQ tool, bypassing the agent
+        if classify_intent(input_text) == "faq":
+            logger.debug("routing FAQ turn for %s directly to restaurant_faq", thread_id)
+            faq_response = restaurant_faq.invoke({"question": input_text})
+            semantic_cache.store(input_text, faq_response, previous_turn)
+            return faq_response, [], False, None
+    
+    # Only the user message is added to the thread; system prompts come from _build_prompt
+    return None, [("user", input_text)], cacheable, previous_turn
+
+def _turn_config(thread_id: str) -> dict:
+    """Build the run config for an agent call, carrying the current booking summary."""
+    configurable = {"thread_id": thread_id}
+    state = booking_state.get(thread_id)
+    if state:
+        configurable["booking_summary"] = summarize_booking_info(state)
+        logger.debug("summary for %s: %s", thread_id, configurable["booking_summary"])
+    return {"configurable": configurable}
+
+# Agent replies are only cached when the turn used nothing but these informational tools
+# (or none): answers built on live data such as table availability must never be replayed
+CACHEABLE_TOOLS = frozenset({"restaurant_faq", "menu_search"})
+
+def _turn_tool_names(messages: list) -> set[str]:
+    """Names of the tools the agent called since the latest user message."""
+    names: set[str] = set()
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        names.update(call["name"] for call in getattr(message, "tool_calls", None) or ())
+    return names
+
+def _finish_turn(response: dict, input_text: str, cacheable: bool, previous_turn: str | None) -> str:
+    """Extract the final message from an agent response and populate the semantic cache."""
+    if response and "messages" in response:
+        messages = response["messages"]
+        if messages:
+            final_message = messages[-1]
+            # Handle different message formats
+            if hasattr(final_message, 'content'):
+                result = final_message.content
+            elif isinstance(final_message, tuple) and len(final_message) > 1:
+                result = final_message[1]
+            else:
+                result = str(final_message)
+            
+            if cacheable and result and _turn_tool_names(messages) <= CACHEABLE_TOOLS:
+                semantic_cache.store(input_text, result, previous_turn)
+            return result
+    
+    return "No response generated."
+
 def run_agent(input_text: str, thread_id: str = "default") -> str:
     """
     Run the agent with the provided input text and maintain conversation memory.
@@ -167,58 +521,106 @@ def run_agent(input_text: str, thread_id: str = "default") -> str:
         str: The agent's response.
     """
     try:
-        print(f"Processing query: {input_text}")
+        early_response, messages, cacheable, previous_turn = _prepare_turn(input_text, thread_id)
+        if early_response is not None:
+            return early_response
         
         # LangGraph agents with checkpointer automatically maintain conversation history
         # Just pass the new user message and the thread_id for memory persistence
-        config = {"configurable": {"thread_id": thread_id}}
-        
-        # Maintain per-thread booking state
-        state = booking_state.get(thread_id, {})
-        updates = extract_booking_info(input_text)
-        if updates:
-            state.update({k: v for k, v in updates.items() if v})
-            booking_state[thread_id] = state
-            print(f"[agent] extracted updates for {thread_id}: {updates}")
-        print(f"[agent] booking_state for {thread_id}: {state}")
+        config = _turn_config(thread_id)
+        response = get_agent().invoke({"messages": messages}, config=config)
+        return _finish_turn(response, input_text, cacheable, previous_turn)
         
-        # Prepare messages for this turn
-        messages = []
+    except Exception as e:
+        return f"Error running agent: {str(e)}"
+
+async def arun_agent(input_text: str, thread_id: str = "default") -> str:
+    """
+    Async variant of run_agent using agent.ainvoke.
+    
+    Independent tool calls within a ReAct step are executed concurrently by the
+    tool node, so multi-tool turns cost max(tool latency) rather than the sum.
+    
+    Args:
+        input_text (str): The input text to process.
+        thread_id (str): Unique identifier for the conversation thread.
         
-        # Inject system prompt only once per thread
-        if thread_id not in seen_threads:
-            messages.append(("system", system_prompt))
-            seen_threads.add(thread_id)
+    Returns:
+        str: The agent's response.
+    """
+    try:
+        # Preprocessing may hit the network (semantic cache embeddings, direct FAQ/booking
+        # tool calls), so it runs in a worker thread to keep the event loop free
+        early_response, messages, cacheable, previous_turn = await asyncio.to_thread(
+            _prepare_turn, input_text, thread_id
+        )
+        if early_response is not None:
+            return early_response
         
-        # Inject dynamic booking context if we have any state
-        if state:
-            summary_msg = summarize_booking_info(state)
-            print(f"[agent] summary for {thread_id}: {summary_msg}")
-            messages.append(("system", summary_msg))
+        config = _turn_config(thread_id)
+        if CHECKPOINTER_SUPPORTS_ASYNC:
+            response = await get_agent().ainvoke({"messages": messages}, config=config)
+        else:
+            response = await asyncio.to_thread(get_agent().invoke, {"messages": messages}, config=config)
+        return await asyncio.to_thread(_finish_turn, response, input_text, cacheable, previous_turn)
         
-        messages.append(("user", input_text))
+    except Exception as e:
+        return f"Error running agent: {str(e)}"
 
-        response = agent.invoke({"messages": messages}, config=config)
+async def astream_agent(input_text: str, thread_id: str = "default") -> AsyncIterator[str]:
+    """
+    Streaming variant of arun_agent that yields response text as the model generates it.
+    
+    Turns answered without the agent (greetings, cache hits, direct FAQ/booking) are
+    yielded as a single chunk. With a sync-only checkpointer the graph cannot be
+    streamed, so the full response is yielded once it is ready.
+    
+    Args:
+        input_text (str): The input text to process.
+        thread_id (str): Unique identifier for the conversation thread.
+        
+    Yields:
+        str: Chunks of the agent's response.
+    """
+    try:
+        early_response, messages, cacheable, previous_turn = await asyncio.to_thread(
+            _prepare_turn, input_text, thread_id
+        )
+        if early_response is not None:
+            yield early_response
+            return
         
-        # Extract the final message from the response
-        if response and "messages" in response:
-            messages = response["messages"]
-            if messages:
-                final_message = messages[-1]
-                # Handle different message formats
-                if hasattr(final_message, 'content'):
-                    return final_message.content
-                elif isinstance(final_message, tuple) and len(final_message) > 1:
-                    return final_message[1]
-                else:
-                    return str(final_message)
+        config = _turn_config(thread_id)
+        if not CHECKPOINTER_SUPPORTS_ASYNC:
+            response = await asyncio.to_thread(get_agent().invoke, {"messages": messages}, config=config)
+            yield await asyncio.to_thread(_finish_turn, response, input_text, cacheable, previous_turn)
+            return
         
-        return "No response generated."
+        # Only text from the last model call is the answer; earlier calls chose tools
+        final_run_id, final_chunks = None, []
+        tools_used: set[str] = set()
+        async for event in get_agent().astream_events({"messages": messages}, config=config, version="v2"):
+            if event["event"] == "on_tool_start":
+                tools_used.add(event["name"])
+            if event["event"] != "on_chat_model_stream":
+                continue
+            content = event["data"]["chunk"].content
+            if not content:
+                continue
+            if event["run_id"] != final_run_id:
+                final_run_id, final_chunks = event["run_id"], []
+            final_chunks.append(content)
+            yield content
+        
+        if cacheable and final_chunks and tools_used <= CACHEABLE_TOOLS:
+            await asyncio.to_thread(semantic_cache.store, input_text, "".join(final_chunks), previous_turn)
         
     except Exception as e:
-        return f"Error running agent: {str(e)}"
+        yield f"Error running agent: {str(e)}"
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+    print(f"Available tools: {[tool.name for tool in tools]}")
     print("Restaurant AI Agent started! Type 'quit' or 'exit' to end the conversation.")
     print("The agent will remember our conversation throughout this session.")
     print("-" * 60)
@@ -232,7 +634,7 @@ if __name__ == "__main__":
             user_input = input("\nYou: ").strip()
             
             # Check for exit commands
-            if user_input.lower() in ['quit', 'exit', 'bye', 'goodbye']:
+            if user_input.lower() in EXIT_COMMANDS:
                 print("Thank you for using the Restaurant AI Agent. Goodbye!")
                 break
             
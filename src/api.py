@@ -1,25 +1,51 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import uuid
+import asyncio
 import logging
-from datetime import datetime
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
+from datetime import datetime, timezone
 import os
+from pathlib import Path
 
 # Import the agent logic
-from .agent import run_agent
+from .agent import arun_agent, astream_agent
+from .tools.faq import get_faq_vectorstore
+from .tools.menu_search import get_menu_vectorstore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Static file locations, resolved once at import
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+REACT_DIR = STATIC_DIR / "app"
+REACT_INDEX = REACT_DIR / "index.html"
+LEGACY_INDEX = STATIC_DIR / "index.html"
+
+async def _warm_vectorstores():
+    """Load (or build) the FAQ and menu vectorstores concurrently"""
+    await asyncio.gather(asyncio.to_thread(get_faq_vectorstore), asyncio.to_thread(get_menu_vectorstore))
+    logger.info("FAQ and menu vectorstores ready")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the vectorstores in the background so startup (and health checks) are not
+    # held up; the first FAQ/menu question waits on the same one-time initialisation
+    app.state.vectorstore_warmup = asyncio.create_task(_warm_vectorstores())
+    yield
+
 # Create FastAPI app
 app = FastAPI(
     title="Restaurant AI Agent API",
     description="A REST API for the Restaurant AI Agent with RAG capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Request/Response models
@@ -36,8 +62,19 @@ class HealthResponse(BaseModel):
     status: str
     message: str
 
-# Store for active conversations (in production, use a proper database)
-active_threads = {}
+# Store for active conversations (in production, use a proper database).
+# Bounded with a TTL so idle threads are evicted instead of accumulating forever.
+active_threads: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+
+# Reservation count for /api/stats, cached briefly to absorb polling from the demo page
+reservation_count_cache: TTLCache = TTLCache(maxsize=1, ttl=30)
+
+def _count_reservations() -> int:
+    """Count bookings with a head-only exact count query (no rows are transferred)"""
+    from .db import supabase
+    
+    result = supabase.table("bookings").select("id", count="exact", head=True).execute()
+    return result.count or 0
 
 # Move API info to /api endpoint instead of root
 @app.get("/api", response_model=dict)
@@ -48,6 +85,7 @@ async def api_info():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
             "health": "/api/health",
             "docs": "/docs",
             "demo": "/demo"
@@ -78,40 +116,80 @@ async def api_chat_with_agent(request: ChatRequest):
         thread_id = request.thread_id or str(uuid.uuid4())
         
         # Log the request
-        logger.info(f"Processing chat request for thread {thread_id}: {request.message}")
+        logger.debug("Processing chat request for thread %s: %s", thread_id, request.message)
         
         # Validate input
         if not request.message or not request.message.strip():
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
         # Run the agent
-        agent_response = run_agent(request.message.strip(), thread_id)
+        agent_response = await arun_agent(request.message.strip(), thread_id)
+        
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
         
         # Store thread info (for tracking active conversations)
-        active_threads[thread_id] = {
-            "last_activity": datetime.now().isoformat(),
-            "message_count": active_threads.get(thread_id, {}).get("message_count", 0) + 1
-        }
+        thread_info = active_threads.setdefault(thread_id, {"message_count": 0})
+        thread_info["message_count"] += 1
+        thread_info["last_activity"] = now
+        # Re-insert so the TTL counts from the latest message, not the first
+        active_threads[thread_id] = thread_info
         
         # Log the response
-        logger.info(f"Agent response for thread {thread_id}: {agent_response[:100]}...")
+        logger.debug("Agent response for thread %s: %.100s...", thread_id, agent_response)
         
         return ChatResponse(
             response=agent_response,
             thread_id=thread_id,
-            timestamp=datetime.now().isoformat()
+            timestamp=now
         )
         
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event; multi-line data is split across data: fields"""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+@app.post("/api/chat/stream")
+async def api_chat_stream(request: ChatRequest):
+    """
+    Chat with the Restaurant AI Agent, streaming the response as Server-Sent Events
+    
+    Emits a "thread" event with the thread_id, unnamed events carrying response text
+    as it is generated, and a final "done" event.
+    """
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    thread_id = request.thread_id or str(uuid.uuid4())
+    logger.debug("Processing streaming chat request for thread %s: %s", thread_id, request.message)
+    
+    async def event_stream():
+        yield _sse_event(thread_id, event="thread")
+        async for chunk in astream_agent(request.message.strip(), thread_id):
+            yield _sse_event(chunk)
+        
+        thread_info = active_threads.setdefault(thread_id, {"message_count": 0})
+        thread_info["message_count"] += 1
+        thread_info["last_activity"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        active_threads[thread_id] = thread_info
+        yield _sse_event("", event="done")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/api/threads", response_model=dict)
 async def api_get_active_threads():
-    """Get information about active conversation threads"""
+    """
+    Get information about active conversation threads.
+    
+    Counts are approximate: threads idle for over an hour are evicted.
+    """
     return {
         "active_threads": len(active_threads),
-        "threads": active_threads
+        "threads": dict(active_threads)
     }
 
 @app.delete("/api/threads/{thread_id}")
@@ -157,85 +235,62 @@ else:
     )
 
 # Mount static files to serve the built frontend
-static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
-if os.path.exists(static_path):
-    app.mount("/static", StaticFiles(directory=static_path), name="static")
+if STATIC_DIR.is_dir():
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
     
     # Mount the built React app
-    react_built = os.path.join(static_path, "app")
-    if os.path.exists(react_built):
-        app.mount("/app", StaticFiles(directory=react_built, html=True), name="react_app")
+    if REACT_DIR.is_dir():
+        app.mount("/app", StaticFiles(directory=REACT_DIR, html=True), name="react_app")
         
         # Mount React assets at root level for proper serving
-        react_assets = os.path.join(react_built, "assets")
-        if os.path.exists(react_assets):
+        react_assets = REACT_DIR / "assets"
+        if react_assets.is_dir():
             app.mount("/assets", StaticFiles(directory=react_assets), name="react_assets")
             
         # Mount voice files at root level for demo functionality
-        voice_path = os.path.join(react_built, "voice")
-        if os.path.exists(voice_path):
+        voice_path = REACT_DIR / "voice"
+        if voice_path.is_dir():
             app.mount("/voice", StaticFiles(directory=voice_path), name="voice_files")
 
-# Serve favicon files from root
-@app.get("/favicon-32x32.png", include_in_schema=False)
-async def serve_favicon_32():
-    """Serve 32x32 favicon from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "favicon-32x32.png")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/png")
-    raise HTTPException(status_code=404, detail="Favicon not found")
-
-@app.get("/favicon-16x16.png", include_in_schema=False)
-async def serve_favicon_16():
-    """Serve 16x16 favicon from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "favicon-16x16.png")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/png")
-    raise HTTPException(status_code=404, detail="Favicon not found")
-
-@app.get("/utensils.png", include_in_schema=False)
-async def serve_utensils_favicon():
-    """Serve utensils.png favicon from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "utensils.png")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/png")
-    raise HTTPException(status_code=404, detail="Favicon not found")
-
-@app.get("/uten.svg", include_in_schema=False)
-async def serve_uten_favicon():
-    """Serve uten.svg favicon from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "uten.svg")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/svg+xml")
-    raise HTTPException(status_code=404, detail="Favicon not found")
-
-@app.get("/favicon.ico", include_in_schema=False)
-async def serve_favicon_ico():
-    """Serve favicon.ico from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "favicon.ico")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/x-icon")
-    raise HTTPException(status_code=404, detail="Favicon not found")
-
-@app.get("/favicon.svg", include_in_schema=False)
-async def serve_favicon_svg():
-    """Serve favicon.svg from root"""
-    favicon_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "app", "favicon.svg")
-    if os.path.exists(favicon_path):
-        return FileResponse(favicon_path, media_type="image/svg+xml")
-    raise HTTPException(status_code=404, detail="Favicon not found")
+def _read_html(path: Path) -> Optional[bytes]:
+    """Read an HTML file once at startup, or None if it has not been built"""
+    return path.read_bytes() if path.is_file() else None
+
+# Frontend pages never change for the lifetime of the process, so read them once
+_INDEX_HTML = _read_html(REACT_INDEX)
+_LEGACY_INDEX_HTML = _read_html(LEGACY_INDEX)
+
+# Serve favicon files from root. Paths are resolved once at startup; missing files map to None.
+FAVICON_MEDIA_TYPES = {
+    "favicon-32x32.png": "image/png",
+    "favicon-16x16.png": "image/png",
+    "utensils.png": "image/png",
+    "uten.svg": "image/svg+xml",
+    "favicon.ico": "image/x-icon",
+    "favicon.svg": "image/svg+xml",
+}
+FAVICONS = {
+    name: (path, media_type) if (path := REACT_DIR / name).is_file() else None
+    for name, media_type in FAVICON_MEDIA_TYPES.items()
+}
+
+async def serve_favicon(request: Request):
+    """Serve a favicon file from root"""
+    favicon = FAVICONS.get(request.url.path.lstrip("/"))
+    if favicon is None:
+        raise HTTPException(status_code=404, detail="Favicon not found")
+    path, media_type = favicon
+    return FileResponse(path, media_type=media_type)
+
+for _favicon_name in FAVICONS:
+    app.add_api_route(f"/{_favicon_name}", serve_favicon, methods=["GET"], include_in_schema=False)
 
 # Serve React app at root for production
 @app.get("/", response_class=HTMLResponse, include_in_schema=False)
 async def serve_frontend():
     """Serve the React frontend application"""
-    root = os.path.dirname(os.path.dirname(__file__))
-    static_dir = os.path.join(root, "static")
-    react_index = os.path.join(static_dir, "app", "index.html")
-    
-    if os.path.exists(react_index):
-        with open(react_index, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
+    if _INDEX_HTML is not None:
+        return HTMLResponse(content=_INDEX_HTML)
     
     # Fallback API info
     return {
@@ -253,16 +308,9 @@ async def serve_frontend():
 @app.get("/demo", response_class=HTMLResponse)
 async def demo_page():
     """Serve the React demo app if built, otherwise the legacy static page."""
-    root = os.path.dirname(os.path.dirname(__file__))
-    static_dir = os.path.join(root, "static")
-    react_index = os.path.join(static_dir, "app", "index.html")
-    legacy_index = os.path.join(static_dir, "index.html")
-
-    try_paths = [react_index, legacy_index]
-    for p in try_paths:
-        if os.path.exists(p):
-            with open(p, "r", encoding="utf-8") as f:
-                return HTMLResponse(content=f.read())
+    demo_html = _INDEX_HTML if _INDEX_HTML is not None else _LEGACY_INDEX_HTML
+    if demo_html is not None:
+        return HTMLResponse(content=demo_html)
 
     return HTMLResponse(content="""
     <html>
@@ -279,33 +327,15 @@ async def demo_page():
     </html>
     """, status_code=404)
 
-# Catch-all route for React Router (must be last)
-@app.get("/{full_path:path}", response_class=HTMLResponse, include_in_schema=False)
-async def catch_all(full_path: str):
-    """Catch-all route to serve React app for client-side routing"""
-    # Don't intercept API routes
-    if full_path.startswith(("api/", "docs", "redoc", "openapi.json")):
-        return {"error": "Not found"}
-    
-    root = os.path.dirname(os.path.dirname(__file__))
-    static_dir = os.path.join(root, "static")
-    react_index = os.path.join(static_dir, "app", "index.html")
-    
-    if os.path.exists(react_index):
-        with open(react_index, "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    
-    return {"error": "Frontend not built"}
-
 @app.get("/api/stats")
 async def get_api_stats():
     """Get API usage statistics for the demo"""
-    from .db import supabase
-    
     try:
         # Get total reservations count
-        reservations_result = supabase.table("bookings").select("*").execute()
-        total_reservations = len(reservations_result.data) if reservations_result.data else 0
+        total_reservations = reservation_count_cache.get("bookings")
+        if total_reservations is None:
+            total_reservations = await asyncio.to_thread(_count_reservations)
+            reservation_count_cache["bookings"] = total_reservations
         
         return {
             "total_reservations": total_reservations,
@@ -328,6 +358,32 @@ async def get_api_stats():
             "error": str(e)
         }
 
+# Client-side routes of the React app are served by the 404 handler, so unmatched paths
+# never reach a Python catch-all route and API paths get a real 404 status
+API_PATH_PREFIXES = ("/api/", "/docs", "/redoc", "/openapi.json")
+
+@app.exception_handler(404)
+async def spa_fallback(request: Request, exc: Exception):
+    """Serve the React app for unmatched page URLs, JSON 404 for everything else"""
+    if (
+        request.method in ("GET", "HEAD")
+        and "endpoint" not in request.scope
+        and _INDEX_HTML is not None
+        and not request.url.path.startswith(API_PATH_PREFIXES)
+    ):
+        return HTMLResponse(content=_INDEX_HTML)
+    
+    return ORJSONResponse({"detail": getattr(exc, "detail", "Not Found")}, status_code=404)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # uvloop + httptools come with uvicorn[standard]. Extra workers need a shared
+    # CHECKPOINT_BACKEND (postgres/redis); the in-memory checkpointer is per process.
+    uvicorn.run(
+        "src.api:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
@@ -1,18 +1,37 @@
 """
 Simplified CRM module for storing customer information to recognize repeat customers
 """
+import asyncio
 import logging
+from collections import defaultdict
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from cachetools import TTLCache
 from db import supabase
 
 logger = logging.getLogger("restaurant-crm")
 
+def _timestamps() -> tuple[str, str]:
+    """Return (ISO timestamp for *_at columns, short display stamp for interaction notes)"""
+    now = datetime.now()
+    return now.isoformat(), now.strftime('%Y-%m-%d %H:%M')
+
+async def _execute(query):
+    """Run a blocking supabase-py query in a worker thread so the caller's event loop keeps serving"""
+    return await asyncio.to_thread(query.execute)
+
 class CRMManager:
     """Simple CRM for customer recognition using phone as primary key"""
     
     def __init__(self):
         self.table_name = "crm_contacts"
+        # Short-lived lookup cache so an interaction doesn't re-select the same contact;
+        # writes below refresh or drop the affected phone
+        self._customer_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+        # Interaction notes buffered per phone and written in one update per burst
+        self.note_flush_delay = 0.5
+        self._pending_notes: Dict[str, List[str]] = defaultdict(list)
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
     
     async def store_customer_info(
         self, 
@@ -36,7 +55,7 @@ class CRMManager:
                 return {"success": False, "error": "Phone number is required"}
             
             # Check if customer already exists
-            existing_contact = self.get_customer_by_phone(phone)
+            existing_contact = await asyncio.to_thread(self.get_customer_by_phone, phone)
             
             if existing_contact:
                 # Update existing customer
@@ -65,23 +84,24 @@ class CRMManager:
     ) -> Dict[str, Any]:
         """Create a new customer record"""
         try:
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
+            now, timestamp = _timestamps()
             formatted_interaction = f"[{timestamp}] {interaction_summary or 'Initial contact'}"
             
             customer_data = {
                 "phone": phone,
                 "name": name,
                 "last_interaction": formatted_interaction,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "created_at": now,
+                "updated_at": now
             }
             
             # Remove None values
             customer_data = {k: v for k, v in customer_data.items() if v is not None}
             
-            result = supabase.table(self.table_name).insert(customer_data).execute()
+            result = await _execute(supabase.table(self.table_name).insert(customer_data))
             
             if result.data:
+                self._customer_cache[phone] = result.data[0]
                 logger.info(f"Created new customer for phone: {phone}")
                 return {"success": True, "data": result.data[0], "action": "created"}
             else:
@@ -99,28 +119,26 @@ class CRMManager:
     ) -> Dict[str, Any]:
         """Update an existing customer record"""
         try:
-            update_data = {"updated_at": datetime.now().isoformat()}
+            now, timestamp = _timestamps()
+            update_data = {"updated_at": now}
             
             if name is not None:
                 update_data["name"] = name
                 
             if interaction_summary is not None:
-                # Get existing customer to append to current last_interaction
-                existing_customer = self.get_customer_by_phone(phone)
-                if existing_customer and existing_customer.get("last_interaction"):
-                    # Append new summary to existing interactions with timestamp
-                    current_interactions = existing_customer["last_interaction"]
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                    new_interaction = f"{current_interactions}\n[{timestamp}] {interaction_summary}"
-                    update_data["last_interaction"] = new_interaction
-                else:
-                    # First interaction or no existing summary
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                    update_data["last_interaction"] = f"[{timestamp}] {interaction_summary}"
-            
-            result = supabase.table(self.table_name).update(update_data).eq("phone", phone).execute()
+                # Append server-side (see crm-append-interaction.sql) so the history is
+                # neither read first nor sent back in full
+                result = await _execute(supabase.rpc("append_interaction", {
+                    "p_phone": phone,
+                    "p_line": f"[{timestamp}] {interaction_summary}",
+                    "p_name": name
+                }))
+            else:
+                result = await _execute(supabase.table(self.table_name).update(update_data).eq("phone", phone))
             
+            self._customer_cache.pop(phone, None)
             if result.data:
+                self._customer_cache[phone] = result.data[0]
                 logger.info(f"Updated customer: {phone}")
                 return {"success": True, "data": result.data[0], "action": "updated"}
             else:
@@ -130,12 +148,62 @@ class CRMManager:
             logger.error(f"Error updating customer: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def store_bulk(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Store many interactions with one server-side upsert-and-append round-trip
+        
+        Records are grouped per phone and passed to append_interactions
+        (crm-append-interaction.sql), which inserts new contacts and appends to
+        existing histories without reading them, so concurrent appends are kept.
+        
+        Args:
+            records: Dicts with "phone" and optional "name" / "interaction_summary"
+            
+        Returns:
+            Dictionary with operation result
+        """
+        try:
+            _, timestamp = _timestamps()
+            entries: Dict[str, Dict[str, Any]] = {}
+            
+            for record in records:
+                phone = record.get("phone")
+                if not phone:
+                    continue
+                line = f"[{timestamp}] {record.get('interaction_summary') or 'Initial contact'}"
+                entry = entries.get(phone)
+                if entry is None:
+                    # One entry per phone: an upsert cannot touch the same row twice
+                    entries[phone] = {"phone": phone, "name": record.get("name"), "line": line}
+                else:
+                    entry["line"] = f"{entry['line']}\n{line}"
+                    entry["name"] = record.get("name") or entry["name"]
+            
+            if not entries:
+                return {"success": True, "data": [], "action": "none"}
+            
+            result = await _execute(supabase.rpc("append_interactions", {"p_entries": list(entries.values())}))
+            for phone in entries:
+                self._customer_cache.pop(phone, None)
+            
+            logger.info(f"Stored {len(records)} interactions for {len(entries)} customers")
+            return {"success": True, "data": result.data or [], "action": "upserted"}
+            
+        except Exception as e:
+            logger.error(f"Error storing customer batch: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     def get_customer_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
         """Retrieve customer by phone number"""
+        cached = self._customer_cache.get(phone)
+        if cached is not None:
+            return cached
+        
         try:
             result = supabase.table(self.table_name).select("*").eq("phone", phone).execute()
             
             if result.data:
+                self._customer_cache[phone] = result.data[0]
                 return result.data[0]
             return None
             
@@ -154,9 +222,44 @@ class CRMManager:
             return []
 
     async def add_interaction_note(self, phone: str, note: str) -> Dict[str, Any]:
-        """Add a note to an existing customer's last_interaction field"""
+        """
+        Queue a note for a customer's last_interaction field
+        
+        Notes added for the same phone within note_flush_delay seconds are written with
+        a single update. Call flush_pending_notes() before reading the record back.
+        """
+        if not phone:
+            return {"success": False, "error": "Phone number is required"}
+        
+        self._pending_notes[phone].append(note)
+        if phone not in self._flush_tasks:
+            self._flush_tasks[phone] = asyncio.create_task(self._flush_notes_after(phone))
+        return {"success": True, "action": "queued"}
+    
+    async def flush_pending_notes(self, phone: Optional[str] = None) -> None:
+        """Write queued notes now, for one phone or for every customer"""
+        phones = [phone] if phone else list(self._pending_notes)
+        for pending_phone in phones:
+            task = self._flush_tasks.pop(pending_phone, None)
+            if task:
+                task.cancel()
+            await self._write_notes(pending_phone)
+    
+    async def _flush_notes_after(self, phone: str) -> None:
+        """Wait for the debounce window, then write every note queued for the phone"""
+        await asyncio.sleep(self.note_flush_delay)
+        # Drop the task first so notes arriving during the write schedule a new flush
+        self._flush_tasks.pop(phone, None)
+        await self._write_notes(phone)
+    
+    async def _write_notes(self, phone: str) -> Dict[str, Any]:
+        """Append the queued notes for a phone with one update"""
+        notes = self._pending_notes.pop(phone, [])
+        if not notes:
+            return {"success": True, "action": "none"}
+        
         try:
-            customer = self.get_customer_by_phone(phone)
+            customer = await asyncio.to_thread(self.get_customer_by_phone, phone)
             if not customer:
                 # Auto-create customer if doesn't exist
                 logger.info(f"Auto-creating customer for phone {phone} to attach note")
@@ -165,17 +268,13 @@ class CRMManager:
                     interaction_summary="Auto-created to store interaction note"
                 )
                 if not create_result.get("success"):
+                    logger.error(f"Failed to auto-create customer {phone} for note")
                     return {"success": False, "error": "Failed to auto-create customer for note"}
-                customer = self.get_customer_by_phone(phone)
-                if not customer:
-                    return {"success": False, "error": "Customer could not be retrieved after auto-create"}
-            
-            current_interaction = customer.get("last_interaction", "")
-            updated_interaction = f"{current_interaction}\n{datetime.now().strftime('%Y-%m-%d %H:%M')}: {note}"
             
+            # update_customer appends the timestamped notes to the existing interactions
             return await self.update_customer(
                 phone=phone,
-                interaction_summary=updated_interaction
+                interaction_summary="\n".join(notes)
             )
             
         except Exception as e:
@@ -185,17 +284,14 @@ class CRMManager:
     def search_customers(self, query: str) -> list:
         """Search customers by name or phone"""
         try:
-            # Search by name
-            name_results = supabase.table(self.table_name).select("*").ilike("name", f"%{query}%").execute()
-            
-            # Search by phone
-            phone_results = supabase.table(self.table_name).select("*").ilike("phone", f"%{query}%").execute()
-            
-            # Combine and deduplicate results
-            all_results = (name_results.data or []) + (phone_results.data or [])
-            unique_results = {customer["phone"]: customer for customer in all_results}.values()
+            # One OR query (backed by the pg_trgm indexes in crm-search-indexes.sql);
+            # commas and parentheses would break PostgREST's or=() filter syntax
+            pattern = f"%{query.translate(str.maketrans('', '', ',()'))}%"
+            results = supabase.table(self.table_name).select("*").or_(
+                f"name.ilike.{pattern},phone.ilike.{pattern}"
+            ).limit(50).execute()
             
-            return list(unique_results)
+            return results.data or []
             
         except Exception as e:
             logger.error(f"Error searching customers: {str(e)}")
@@ -1,5 +1,10 @@
 import os
-from supabase import create_client, Client
+import sys
+from typing import Iterable
+
+import httpx
+import orjson
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file in the same directory
@@ -7,7 +12,60 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+
+# One keep-alive HTTP/2 session shared by the PostgREST, storage and functions clients,
+# so queries reuse warm connections instead of paying a TLS handshake each time
+http_client = httpx.Client(
+    http2=True,
+    timeout=5.0,
+    # Idle connections are recycled after 30s, before load balancers silently drop them
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30),
+)
+supabase: Client = create_client(url, key, options=ClientOptions(httpx_client=http_client))
+
+# Headers for raw PostgREST writes; return=minimal skips echoing the inserted rows back
+_insert_headers = {
+    "apikey": key or "",
+    "Authorization": f"Bearer {key}",
+    "Content-Type": "application/json",
+    "Prefer": "return=minimal",
+}
+
+def insert_rows(table: str, rows: list) -> None:
+    """
+    Insert rows (dicts or dataclasses) with a single orjson-encoded POST on the shared HTTP/2 session.
+
+    For write-only hot paths (e.g. call logs) where the inserted rows are not needed;
+    raises httpx.HTTPStatusError if PostgREST rejects the insert.
+    """
+    response = http_client.post(f"{url}/rest/v1/{table}", content=orjson.dumps(rows), headers=_insert_headers)
+    response.raise_for_status()
+
+# Column order of the calls table rows written by COPY
+CALL_LOG_COLUMNS = (
+    "client_id", "caller", "start_time", "end_time", "duration", "status", "booking_made", "transcript",
+    "llm_tokens_input", "llm_tokens_output", "stt_seconds", "tts_characters", "estimated_cost",
+)
+
+def bulk_log_calls(rows: Iterable[dict]) -> int:
+    """
+    Stream call-log rows into the calls table with Postgres COPY (backfills / replaying missed calls).
+
+    Connects directly to Postgres at SUPABASE_DB_URL (needs the optional psycopg package);
+    real-time call logs keep using `insert_rows`. Missing columns are written as NULL.
+
+    Returns:
+        int: Number of rows copied.
+    """
+    import psycopg
+
+    copied = 0
+    with psycopg.connect(os.environ["SUPABASE_DB_URL"]) as conn:
+        with conn.cursor().copy(f"COPY calls ({', '.join(CALL_LOG_COLUMNS)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(tuple(row.get(column) for column in CALL_LOG_COLUMNS))
+                copied += 1
+    return copied
 
 def test_connection():
     """Test the Supabase connection"""
@@ -33,5 +91,15 @@ def test_connection():
             print(f"Alternative test also failed: {str(e2)}")
             return False
 
+def _read_jsonl(path: str):
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
 if __name__ == "__main__":
-    test_connection()
\ No newline at end of file
+    # python db.py backfill-calls calls.jsonl  -> bulk-load exported call rows (one JSON object per line)
+    if sys.argv[1:2] == ["backfill-calls"] and len(sys.argv) == 3:
+        print(f"✅ Copied {bulk_log_calls(_read_jsonl(sys.argv[2]))} call rows")
+    else:
+        test_connection()
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Semantic response cache for informational agent turns (FAQ / menu questions)
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from langchain_openai import OpenAIEmbeddings
+from langchain_chroma import Chroma
+
+logger = logging.getLogger("restaurant-semantic-cache")
+
+class SemanticCache:
+    """
+    Return cached agent answers for paraphrased questions asked in the same context.
+
+    Entries older than `ttl` seconds are ignored and deleted; once `maxsize` entries
+    are stored the oldest are evicted.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 86400, maxsize: int = 1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._store: Optional[Chroma] = None
+        # Guards store creation and the eviction queue (lookups run in worker threads)
+        self._lock = threading.Lock()
+        self._entries: deque[tuple[str, float]] = deque()
+
+    def _get_store(self) -> Chroma:
+        """Create the in-memory cache collection on first use"""
+        with self._lock:
+            if self._store is None:
+                self._store = Chroma(
+                    collection_name="agent_response_cache",
+                    embedding_function=OpenAIEmbeddings(model="text-embedding-3-small"),
+                    collection_metadata={"hnsw:space": "cosine"},
+                )
+            return self._store
+
+    @staticmethod
+    def context_key(previous_turn: Optional[str]) -> str:
+        """Hash the previous user turn so follow-ups only match in the same context"""
+        return hashlib.sha1((previous_turn or "").strip().lower().encode("utf-8")).hexdigest()
+
+    def lookup(self, question: str, previous_turn: Optional[str] = None) -> Optional[str]:
+        """Return a cached response for a semantically similar question, if any"""
+        try:
+            results = self._get_store().similarity_search_with_relevance_scores(
+                question,
+                k=1,
+                filter={"$and": [
+                    {"context": self.context_key(previous_turn)},
+                    {"created_at": {"$gte": time.time() - self.ttl}},
+                ]},
+            )
+            if results:
+                doc, score = results[0]
+                if score >= self.threshold:
+                    logger.info("Semantic cache hit (%.3f) for: %s", score, question)
+                    return doc.metadata.get("response")
+        except Exception as e:
+            logger.error("Semantic cache lookup failed: %s", e)
+        return None
+
+    def store(self, question: str, response: str, previous_turn: Optional[str] = None) -> None:
+        """Cache a rendered response for future similar questions"""
+        try:
+            store = self._get_store()
+            created = time.time()
+            ids = store.add_texts(
+                [question],
+                metadatas=[{"response": response, "context": self.context_key(previous_turn), "created_at": created}],
+            )
+            with self._lock:
+                self._entries.extend((entry_id, created) for entry_id in ids)
+                # Oldest entries are at the front: drop the expired ones and any over maxsize
+                stale = []
+                while self._entries and (len(self._entries) > self.maxsize or self._entries[0][1] < created - self.ttl):
+                    stale.append(self._entries.popleft()[0])
+            if stale:
+                store.delete(ids=stale)
+        except Exception as e:
+            logger.error("Semantic cache store failed: %s", e)
+
+# Global semantic cache instance
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+    maxsize=int(os.getenv("SEMANTIC_CACHE_MAXSIZE", "1024")),
+)
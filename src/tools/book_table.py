@@ -1,6 +1,10 @@
+import logging
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import heapq
+from operator import itemgetter
 import re
 from dateutil import parser
 from dotenv import load_dotenv
@@ -9,199 +13,197 @@ from langchain.tools import tool
 # Add the src directory to the path to import db module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from db import supabase
+from .check_availability import (
+    MAX_CAPACITY_PER_TIME_SLOT, MAX_TABLES, TIME_SLOT_HOURS, TIME_SLOTS, get_slot_totals, invalidate_slot_totals
+)
 
 # Load environment variables
 load_dotenv()
 
-def parse_natural_date(date_input: str) -> str:
+logger = logging.getLogger("restaurant-reservations")
+
+# First line of every successful booking reply; callers check result.startswith(BOOKING_CONFIRMED)
+BOOKING_CONFIRMED = "✅ Table successfully booked!"
+
+# Date parsing tables and patterns, compiled once at import
+WEEKDAYS = {
+    'monday': 0, 'mon': 0, 'tuesday': 1, 'tues': 1, 'tue': 1, 'wednesday': 2, 'wed': 2,
+    'thursday': 3, 'thurs': 3, 'thu': 3, 'friday': 4, 'fri': 4,
+    'saturday': 5, 'sat': 5, 'sunday': 6, 'sun': 6
+}
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+# Longest names first so "tuesday" wins over "tue"
+_RE_WEEKDAY = re.compile(r'\b(next\s+)?(' + '|'.join(sorted(WEEKDAYS, key=len, reverse=True)) + r')\b')
+_RE_MONTH = re.compile(
+    r'\b(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+    r'|sep(?:t|tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b'
+)
+_RE_DAY = re.compile(r'\b(\d{1,2})\b')
+_RE_YEAR = re.compile(r'\b(20\d{2})\b')
+_RE_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_RE_MDY = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$')
+# Slot totals reported by the bookings_enforce_capacity trigger
+_RE_CAPACITY_EXCEEDED = re.compile(r'CAPACITY_EXCEEDED: (\d+) guests and (\d+) tables')
+
+def parse_natural_date(date_input: str) -> date:
     """
-    Parse natural language date input into YYYY-MM-DD format.
+    Parse natural language date input into a date.
     
     Args:
         date_input (str): Natural language date like "tomorrow", "next Friday", "August 15", etc.
         
     Returns:
-        str: Date in YYYY-MM-DD format
+        date: The parsed date (use .isoformat() for YYYY-MM-DD)
         
     Raises:
         ValueError: If date cannot be parsed
     """
-    date_input = date_input.strip().lower()
-    today = datetime.now().date()
+    # Agent tool calls usually pass YYYY-MM-DD already
+    if _RE_ISO.match(date_input):
+        return date.fromisoformat(date_input)
+    
+    # Today is part of the cache key so relative dates never go stale across midnight
+    return _parse_natural_date(date_input.strip().lower(), datetime.now().date())
+
+@lru_cache(maxsize=256)
+def _parse_natural_date(date_input: str, today: date) -> date:
+    """Cached worker for parse_natural_date (date_input is already stripped and lowercased)."""
     current_year = today.year
     
     # Handle relative dates
     if date_input in ['today']:
-        return today.strftime("%Y-%m-%d")
+        return today
     elif date_input in ['tomorrow']:
-        return (today + timedelta(days=1)).strftime("%Y-%m-%d")
+        return (today + timedelta(days=1))
     elif date_input in ['day after tomorrow']:
-        return (today + timedelta(days=2)).strftime("%Y-%m-%d")
+        return (today + timedelta(days=2))
     elif 'next week' in date_input:
-        return (today + timedelta(days=7)).strftime("%Y-%m-%d")
-    
-    # Handle "next [weekday]"
-    weekdays = {
-        'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-        'friday': 4, 'saturday': 5, 'sunday': 6
-    }
+        return (today + timedelta(days=7))
     
-    for day_name, day_num in weekdays.items():
-        if f'next {day_name}' in date_input:
-            days_ahead = day_num - today.weekday()
+    # Handle "next [weekday]", "this Friday", "Friday", etc.
+    weekday_match = _RE_WEEKDAY.search(date_input)
+    if weekday_match:
+        days_ahead = WEEKDAYS[weekday_match.group(2)] - today.weekday()
+        if weekday_match.group(1):
             if days_ahead <= 0:  # Target day already happened this week
                 days_ahead += 7
-            return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
-        elif day_name in date_input and 'next' not in date_input:
-            # Handle "this Friday", "Friday", etc.
-            days_ahead = day_num - today.weekday()
+            return (today + timedelta(days=days_ahead))
+        elif 'next' not in date_input:
             if days_ahead < 0:  # If the day already passed this week, get next week's
                 days_ahead += 7
             elif days_ahead == 0:  # If it's today, assume they mean next week
                 days_ahead = 7
-            return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
-    
-    # Handle month names with day numbers
-    months = {
-        'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
-        'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
-        'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
-        'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
-    }
+            return (today + timedelta(days=days_ahead))
     
     # Try to match "Month Day" or "Month Day, Year" patterns
-    for month_name, month_num in months.items():
-        if month_name in date_input:
-            # Extract day number
-            day_match = re.search(r'\b(\d{1,2})\b', date_input)
-            if day_match:
-                day = int(day_match.group(1))
-                
-                # Check if year is mentioned
-                year_match = re.search(r'\b(20\d{2})\b', date_input)
-                year = int(year_match.group(1)) if year_match else current_year
-                
-                # If the date would be in the past, assume next year
-                try:
-                    parsed_date = datetime(year, month_num, day).date()
-                    if parsed_date < today:
-                        parsed_date = datetime(year + 1, month_num, day).date()
-                    return parsed_date.strftime("%Y-%m-%d")
-                except ValueError:
-                    continue  # Invalid date, try other parsing methods
+    month_match = _RE_MONTH.search(date_input)
+    if month_match:
+        month_num = MONTHS[month_match.group(1)[:3]]
+        # Extract day number
+        day_match = _RE_DAY.search(date_input)
+        if day_match:
+            day = int(day_match.group(1))
+            
+            # Check if year is mentioned
+            year_match = _RE_YEAR.search(date_input)
+            year = int(year_match.group(1)) if year_match else current_year
+            
+            # If the date would be in the past, assume next year
+            try:
+                parsed_date = datetime(year, month_num, day).date()
+                if parsed_date < today:
+                    parsed_date = datetime(year + 1, month_num, day).date()
+                return parsed_date
+            except ValueError:
+                pass  # Invalid date, try other parsing methods
+    
+    # Check if it's already in YYYY-MM-DD format (e.g. with surrounding whitespace)
+    if _RE_ISO.match(date_input):
+        return date.fromisoformat(date_input)
+    
+    # Check if it's in MM/DD or MM/DD/YYYY format (before dateutil, the slowest branch)
+    date_match = _RE_MDY.match(date_input)
+    if date_match:
+        month, day, year_given = date_match.groups()
+        year = int(year_given) if year_given else current_year
+        try:
+            parsed_date = datetime(year, int(month), int(day)).date()
+            if parsed_date < today and not year_given:
+                parsed_date = datetime(year + 1, int(month), int(day)).date()
+            return parsed_date
+        except ValueError:
+            pass
     
     # Try to parse with dateutil for other formats
     try:
         # Add current year if not specified
-        if not re.search(r'\b20\d{2}\b', date_input):
-            date_input = f"{date_input} {current_year}"
+        dateutil_input = date_input
+        if not _RE_YEAR.search(dateutil_input):
+            dateutil_input = f"{dateutil_input} {current_year}"
         
-        parsed_date = parser.parse(date_input, default=datetime(current_year, 1, 1)).date()
+        parsed_date = parser.parse(dateutil_input, default=datetime(current_year, 1, 1)).date()
         
         # If parsed date is in the past, try next year
         if parsed_date < today:
-            parsed_date = parser.parse(date_input, default=datetime(current_year + 1, 1, 1)).date()
+            parsed_date = parser.parse(dateutil_input, default=datetime(current_year + 1, 1, 1)).date()
         
-        return parsed_date.strftime("%Y-%m-%d")
+        return parsed_date
     except:
         pass
     
-    # Check if it's already in YYYY-MM-DD format
-    if re.match(r'^\d{4}-\d{2}-\d{2}$', date_input):
-        return date_input
-    
-    # Check if it's in MM/DD or MM/DD/YYYY format
-    date_match = re.match(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$', date_input)
-    if date_match:
-        month, day, year = date_match.groups()
-        year = int(year) if year else current_year
-        try:
-            parsed_date = datetime(year, int(month), int(day)).date()
-            if parsed_date < today and not year:
-                parsed_date = datetime(year + 1, int(month), int(day)).date()
-            return parsed_date.strftime("%Y-%m-%d")
-        except ValueError:
-            pass
-    
     raise ValueError(f"Unable to parse date: '{date_input}'. Please try formats like 'tomorrow', 'next Friday', 'August 15', or 'YYYY-MM-DD'.")
 
-def check_availability(date: str, time: str, party_size: int) -> dict:
+def unavailable_response(date: str, time: str, party_size: int, guests_booked: int, tables_booked: int) -> dict:
     """
-    Check if a table is available for the given date, time, and party size.
+    Build the "not available" result for a full time slot, with alternative times.
     
     Args:
         date (str): Date for the reservation in YYYY-MM-DD format.
         time (str): Time for the reservation in HH:MM format.
         party_size (int): Number of people for the reservation.
+        guests_booked (int): Guests already booked for the slot.
+        tables_booked (int): Reservations already booked for the slot.
         
     Returns:
-        dict: {"available": bool, "message": str, "suggestions": list}
+        dict: {"available": False, "message": str, "suggestions": list}
     """
-    try:
-        # Normalize time format for comparison (database stores as HH:MM:SS)
-        time_patterns = [time, f"{time}:00"]  # Check both HH:MM and HH:MM:SS formats
-        
-        existing_reservations_data = []
-        for time_pattern in time_patterns:
-            reservations = supabase.table("bookings").select("*").eq("date", date).eq("time", time_pattern).execute()
-            if reservations.data:
-                existing_reservations_data.extend(reservations.data)
-        
-        # Remove duplicates if any
-        seen_ids = set()
-        unique_reservations = []
-        for reservation in existing_reservations_data:
-            if reservation['id'] not in seen_ids:
-                unique_reservations.append(reservation)
-                seen_ids.add(reservation['id'])
-        
-        # Restaurant capacity settings (you can adjust these)
-        # Configuration from environment variables
-        MAX_TABLES = int(os.getenv('MAX_TABLES', '10'))  # Total number of tables
-        MAX_CAPACITY_PER_TIME_SLOT = int(os.getenv('MAX_CAPACITY_PER_TIME_SLOT', '50'))  # Maximum people that can be served at one time
-        
-        if unique_reservations:
-            # Calculate total guests already booked for this time slot
-            total_guests_booked = sum(reservation.get("guests", 0) for reservation in unique_reservations)
-            
-            # Check if adding this party would exceed capacity
-            if total_guests_booked + party_size > MAX_CAPACITY_PER_TIME_SLOT:
-                # Suggest alternative times
-                suggestions = get_alternative_times(date, time, party_size)
-                return {
-                    "available": False,
-                    "message": f"❌ Sorry, we don't have capacity for {party_size} people at {time} on {date}. "
-                             f"We currently have {total_guests_booked} guests booked for that time slot. "
-                             f"Our maximum capacity per time slot is {MAX_CAPACITY_PER_TIME_SLOT} guests.\n\n"
-                             f"📅 Available alternatives:\n" + "\n".join(suggestions),
-                    "suggestions": suggestions
-                }
-            
-            # Check if we have reached maximum number of tables
-            if len(unique_reservations) >= MAX_TABLES:
-                suggestions = get_alternative_times(date, time, party_size)
-                return {
-                    "available": False,
-                    "message": f"❌ Sorry, all {MAX_TABLES} tables are booked for {time} on {date}. "
-                             f"📅 Available alternatives:\n" + "\n".join(suggestions),
-                    "suggestions": suggestions
-                }
-        
-        # If we reach here, the time slot is available
-        return {
-            "available": True,
-            "message": f"✅ Table available for {party_size} people at {time} on {date}!",
-            "suggestions": []
-        }
+    suggestions = get_alternative_times(date, time, party_size)
+    if guests_booked + party_size > MAX_CAPACITY_PER_TIME_SLOT:
+        message = (f"❌ Sorry, we don't have capacity for {party_size} people at {time} on {date}. "
+                   f"We currently have {guests_booked} guests booked for that time slot. "
+                   f"Our maximum capacity per time slot is {MAX_CAPACITY_PER_TIME_SLOT} guests.\n\n")
+    else:
+        message = f"❌ Sorry, all {MAX_TABLES} tables are booked for {time} on {date}. "
+    
+    return {
+        "available": False,
+        "message": message + "📅 Available alternatives:\n" + "\n".join(suggestions),
+        "suggestions": suggestions
+    }
+
+def capacity_exceeded_message(error_message: str, date: str, time: str, party_size: int) -> str:
+    """
+    Build the not-booked reply for a write refused by the bookings_enforce_capacity trigger.
+    
+    Nothing was written, so availability is never re-checked here (that could report the
+    slot as open); the slot totals come from the trigger's error instead.
+    
+    Args:
+        error_message (str): The CAPACITY_EXCEEDED database error.
+        date (str): Requested date in YYYY-MM-DD format.
+        time (str): Requested time in HH:MM format.
+        party_size (int): Number of people for the reservation.
         
-    except Exception as e:
-        print(f"DEBUG: Availability check error: {str(e)}")
-        # If there's an error checking availability, allow the booking to proceed
-        return {
-            "available": True,
-            "message": "⚠️ Unable to verify availability, but proceeding with booking.",
-            "suggestions": []
-        }
+    Returns:
+        str: The "not available" message with alternative times.
+    """
+    invalidate_slot_totals(date)
+    totals = _RE_CAPACITY_EXCEEDED.search(error_message)
+    guests_booked, tables_booked = map(int, totals.groups()) if totals else (MAX_CAPACITY_PER_TIME_SLOT, MAX_TABLES)
+    return unavailable_response(date, time, party_size, guests_booked, tables_booked)["message"]
 
 def get_alternative_times(date: str, requested_time: str, party_size: int) -> list:
     """
@@ -219,46 +221,26 @@ def get_alternative_times(date: str, requested_time: str, party_size: int) -> li
         suggestions = []
         requested_hour = int(requested_time.split(':')[0])
         
-        # Generate time slots (every hour from 10 AM to 10 PM)
-        time_slots = [f"{hour:02d}:00" for hour in range(10, 23)]
+        slot_totals = get_slot_totals(date)
         
         # Check each time slot for availability
-        for time_slot in time_slots:
+        for hour, time_slot in zip(TIME_SLOT_HOURS, TIME_SLOTS):
             if time_slot == requested_time:
                 continue  # Skip the originally requested time
-                
-            # Check both time formats (HH:MM and HH:MM:SS)
-            time_patterns = [time_slot, f"{time_slot}:00"]
-            existing_reservations_data = []
-            
-            for time_pattern in time_patterns:
-                reservations = supabase.table("bookings").select("*").eq("date", date).eq("time", time_pattern).execute()
-                if reservations.data:
-                    existing_reservations_data.extend(reservations.data)
-            
-            # Remove duplicates
-            seen_ids = set()
-            unique_reservations = []
-            for reservation in existing_reservations_data:
-                if reservation['id'] not in seen_ids:
-                    unique_reservations.append(reservation)
-                    seen_ids.add(reservation['id'])
             
-            total_guests_booked = sum(reservation.get("guests", 0) for reservation in unique_reservations)
-            tables_booked = len(unique_reservations)
+            total_guests_booked, tables_booked = slot_totals.get(time_slot, (0, 0))
             
             # Check if this time slot can accommodate the party
-            if (total_guests_booked + party_size <= 50 and tables_booked < 10):
+            if (total_guests_booked + party_size <= MAX_CAPACITY_PER_TIME_SLOT and tables_booked < MAX_TABLES):
                 # Prioritize times closer to the requested time
-                hour_diff = abs(int(time_slot.split(':')[0]) - requested_hour)
+                hour_diff = abs(hour - requested_hour)
                 suggestions.append((hour_diff, f"• {time_slot} - Available for {party_size} people"))
         
-        # Sort by time difference and return top 3 suggestions
-        suggestions.sort(key=lambda x: x[0])
-        return [suggestion[1] for suggestion in suggestions[:3]]
+        # Return the 3 suggestions closest to the requested time
+        return [suggestion[1] for suggestion in heapq.nsmallest(3, suggestions, key=itemgetter(0))]
         
-    except Exception as e:
-        print(f"DEBUG: Error getting alternative times: {str(e)}")
+    except Exception:
+        logger.exception("Error getting alternative times")
         return ["• Please call us at (555) 123-4567 for availability"]
 
 @tool
@@ -289,12 +271,11 @@ def book_table(name: str, date: str, time: str, party_size: int, phone: str | No
         
         # Parse natural language date input
         try:
-            parsed_date = parse_natural_date(date)
+            reservation_date = parse_natural_date(date)
             # Validate the parsed date
-            reservation_date = datetime.strptime(parsed_date, "%Y-%m-%d")
-            today = datetime.now().date()
-            if reservation_date.date() < today:
+            if reservation_date < datetime.now().date():
                 return "Error: Cannot book a table for a past date."
+            parsed_date = reservation_date.isoformat()
         except ValueError as e:
             return f"Error: {str(e)}"
         
@@ -308,57 +289,56 @@ def book_table(name: str, date: str, time: str, party_size: int, phone: str | No
         except ValueError:
             return "Error: Invalid time format. Please use HH:MM format (24-hour)."
         
-        # Check availability before booking
-        availability_check = check_availability(parsed_date, time, party_size)
-        if not availability_check["available"]:
-            return availability_check["message"]
-        
-        # Prepare reservation data
-        reservation_data = {
-            "name": name.strip(),
-            "date": parsed_date,
-            "time": time,
-            "guests": party_size
-        }
-        
-        # Add phone number if provided
-        if phone and phone.strip():
-            reservation_data["phone"] = phone.strip()
+        # Check capacity and insert in one atomic round trip (see book-table-atomic.sql)
+        result = supabase.rpc("book_table_atomic", {
+            "p_date": parsed_date,
+            "p_time": time,
+            "p_party_size": party_size,
+            "p_name": name.strip(),
+            "p_phone": phone.strip() if phone else None,
+            "p_max_tables": MAX_TABLES,
+            "p_max_capacity": MAX_CAPACITY_PER_TIME_SLOT
+        }).execute()
+        invalidate_slot_totals(parsed_date)
         
-        # Insert reservation into database
-        result = supabase.table("bookings").insert(reservation_data).execute()
+        if result.data and not result.data.get("available"):
+            return unavailable_response(
+                parsed_date, time, party_size,
+                result.data.get("guests_booked", 0), result.data.get("tables_booked", 0)
+            )["message"]
         
         if result.data:
-            reservation_id = result.data[0].get("id", "N/A")
+            reservation_id = result.data.get("id", "N/A")
             # Format the date nicely for display
-            display_date = datetime.strptime(parsed_date, "%Y-%m-%d").strftime("%A, %B %d, %Y")
+            display_date = reservation_date.strftime("%A, %B %d, %Y")
             
-            # Build confirmation message
-            confirmation = (f"✅ Table successfully booked!\n"
-                           f"Reservation Details:\n"
-                           f"• Name: {name}\n"
-                           f"• Date: {display_date}\n"
-                           f"• Time: {time}\n"
-                           f"• Party Size: {party_size} people\n")
-            
-            if phone and phone.strip():
-                confirmation += f"• Phone: {phone.strip()}\n"
-            
-            confirmation += (f"• Reservation ID: {reservation_id}\n"
-                            f"• Status: Confirmed\n\n"
-                            f"Please arrive 15 minutes before your reservation time. "
-                            f"If you need to cancel or modify your reservation, please contact us with your reservation ID.")
+            # Build confirmation message in one join (the phone line is optional)
+            phone_line = f"• Phone: {phone.strip()}" if phone and phone.strip() else None
+            confirmation = "\n".join(filter(None, [
+                BOOKING_CONFIRMED,
+                "Reservation Details:",
+                f"• Name: {name}",
+                f"• Date: {display_date}",
+                f"• Time: {time}",
+                f"• Party Size: {party_size} people",
+                phone_line,
+                f"• Reservation ID: {reservation_id}",
+                "• Status: Confirmed\n",
+                "Please arrive 15 minutes before your reservation time. "
+                "If you need to cancel or modify your reservation, please contact us with your reservation ID."
+            ]))
             
             return confirmation
         else:
             return "Error: Failed to create reservation. Please try again."
             
     except Exception as e:
-        # Log the error for debugging (you might want to use proper logging)
         error_message = str(e)
-        print(f"DEBUG: Exception details: {error_message}")  # Added for debugging
-        print(f"DEBUG: Exception type: {type(e)}")  # Added for debugging
         
+        if "CAPACITY_EXCEEDED" in error_message:
+            return capacity_exceeded_message(error_message, parsed_date, time, party_size)
+        
+        logger.exception("Error booking table")
         if "duplicate" in error_message.lower():
             return "Error: A reservation already exists for this date and time. Please choose a different time slot."
         elif "connection" in error_message.lower():
@@ -1,16 +1,40 @@
+import logging
 import os
 import sys
 from datetime import datetime
+import httpx
 from dotenv import load_dotenv
 from langchain.tools import tool
 
 # Add the src directory to the path to import db module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from db import supabase
+from .check_availability import invalidate_slot_totals
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger("restaurant-reservations")
+
+RESERVATION_KEYS = ("name", "date", "time", "guests")
+RESERVATION_COLUMNS = ",".join(("id",) + RESERVATION_KEYS)
+
+def _format_reservation(reservation_id: int, reservation: dict) -> str:
+    """Render the shared ID/name/date/time/party-size lines of a reservation."""
+    name, date, time, guests = (reservation.get(key, 'N/A') for key in RESERVATION_KEYS)
+    return (f"• Reservation ID: {reservation_id}\n"
+            f"• Name: {name}\n"
+            f"• Date: {date}\n"
+            f"• Time: {time}\n"
+            f"• Party Size: {guests} people\n")
+
+def _handle_db_error(e: Exception, action: str) -> str:
+    """Log a failed reservation lookup/write and return the user-facing error."""
+    logger.exception("Error %s reservation", action)
+    if isinstance(e, httpx.TransportError):
+        return "Error: Unable to connect to the database. Please try again later."
+    return f"Error: An unexpected error occurred while {action} your reservation. Details: {str(e)}"
+
 @tool
 def cancel_reservation(reservation_id: int, reason: str = None) -> str:
     """
@@ -28,49 +52,33 @@ def cancel_reservation(reservation_id: int, reason: str = None) -> str:
         if not reservation_id or reservation_id <= 0:
             return "Error: Valid reservation ID is required."
         
-        # Check if reservation exists
-        existing_reservation = supabase.table("bookings").select("*").eq("id", reservation_id).execute()
-        
-        if not existing_reservation.data:
-            return f"Error: No reservation found with ID {reservation_id}."
-        
-        current_reservation = existing_reservation.data[0]
-        
         # Since we don't have a status column, we'll delete the reservation
         # In a production system, you might want to move it to a "cancelled_bookings" table
         # or add a status column to the bookings table
         
-        # Delete the reservation from the database
+        # Delete and return the reservation in one round trip, so a concurrent
+        # cancel of the same ID finds nothing instead of double-cancelling
         result = supabase.table("bookings").delete().eq("id", reservation_id).execute()
         
-        if result.data:
-            # Format the cancellation confirmation
-            return (f"✅ Reservation successfully cancelled!\n\n"
-                   f"Cancelled Reservation Details:\n"
-                   f"• Reservation ID: {reservation_id}\n"
-                   f"• Name: {current_reservation.get('name', 'N/A')}\n"
-                   f"• Date: {current_reservation.get('date', 'N/A')}\n"
-                   f"• Time: {current_reservation.get('time', 'N/A')}\n"
-                   f"• Party Size: {current_reservation.get('guests', 'N/A')} people\n"
-                   f"• Status: Cancelled and Removed\n"
-                   f"• Cancelled at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                   f"Your reservation has been cancelled and removed from our system. "
-                   f"The table is now available for other guests. "
-                   f"We're sorry to see you go! If you'd like to make a new reservation in the future, "
-                   f"please don't hesitate to contact us.")
-        else:
-            return "Error: Failed to cancel reservation. Please try again."
+        if not result.data:
+            return f"Error: No reservation found with ID {reservation_id}."
+        
+        current_reservation = result.data[0]
+        invalidate_slot_totals(current_reservation.get("date"))
+        
+        # Format the cancellation confirmation
+        return (f"✅ Reservation successfully cancelled!\n\n"
+               f"Cancelled Reservation Details:\n"
+               f"{_format_reservation(reservation_id, current_reservation)}"
+               f"• Status: Cancelled and Removed\n"
+               f"• Cancelled at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+               f"Your reservation has been cancelled and removed from our system. "
+               f"The table is now available for other guests. "
+               f"We're sorry to see you go! If you'd like to make a new reservation in the future, "
+               f"please don't hesitate to contact us.")
             
     except Exception as e:
-        # Log the error for debugging
-        error_message = str(e)
-        print(f"DEBUG: Exception details: {error_message}")
-        print(f"DEBUG: Exception type: {type(e)}")
-        
-        if "connection" in error_message.lower():
-            return "Error: Unable to connect to the database. Please try again later."
-        else:
-            return f"Error: An unexpected error occurred while cancelling your reservation. Details: {error_message}"
+        return _handle_db_error(e, "cancelling")
 
 
 @tool
@@ -90,30 +98,18 @@ def view_reservation(reservation_id: int) -> str:
             return "Error: Valid reservation ID is required."
         
         # Get reservation details
-        reservation_result = supabase.table("bookings").select("*").eq("id", reservation_id).execute()
+        reservation_result = supabase.table("bookings").select(f"{RESERVATION_COLUMNS},created_at").eq("id", reservation_id).maybe_single().execute()
         
-        if not reservation_result.data:
+        if not reservation_result or not reservation_result.data:
             return f"Error: No reservation found with ID {reservation_id}."
         
-        reservation = reservation_result.data[0]
+        reservation = reservation_result.data
         
         return (f"📋 Reservation Details\n\n"
-               f"• Reservation ID: {reservation_id}\n"
-               f"• Name: {reservation.get('name', 'N/A')}\n"
-               f"• Date: {reservation.get('date', 'N/A')}\n"
-               f"• Time: {reservation.get('time', 'N/A')}\n"
-               f"• Party Size: {reservation.get('guests', 'N/A')} people\n"
+               f"{_format_reservation(reservation_id, reservation)}"
                f"• Status: ✅ Confirmed\n"
                f"• Created: {reservation.get('created_at', 'N/A')}\n\n"
                f"💡 You can modify or cancel this reservation if needed.")
             
     except Exception as e:
-        # Log the error for debugging
-        error_message = str(e)
-        print(f"DEBUG: Exception details: {error_message}")
-        print(f"DEBUG: Exception type: {type(e)}")
-        
-        if "connection" in error_message.lower():
-            return "Error: Unable to connect to the database. Please try again later."
-        else:
-            return f"Error: An unexpected error occurred while retrieving your reservation. Details: {error_message}"
+        return _handle_db_error(e, "retrieving")
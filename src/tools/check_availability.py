@@ -1,8 +1,13 @@
+import logging
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import heapq
+from operator import itemgetter
 import re
-from dateutil import parser
+import threading
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from langchain.tools import tool
 
@@ -13,13 +18,51 @@ from db import supabase
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger("restaurant-reservations")
+
+# Restaurant capacity settings, read once at import
+MAX_TABLES = int(os.getenv('MAX_TABLES', '10'))  # Total number of tables
+MAX_CAPACITY_PER_TIME_SLOT = int(os.getenv('MAX_CAPACITY_PER_TIME_SLOT', '50'))  # Maximum people that can be served at one time
+
+# Bookable time slots: every hour from 10 AM to 10 PM
+TIME_SLOT_HOURS = tuple(range(10, 23))
+TIME_SLOTS = tuple(f"{hour:02d}:00" for hour in TIME_SLOT_HOURS)
+
+# Date parsing tables and patterns, compiled once at import
+WEEKDAYS = {
+    'monday': 0, 'mon': 0, 'tuesday': 1, 'tues': 1, 'tue': 1, 'wednesday': 2, 'wed': 2,
+    'thursday': 3, 'thurs': 3, 'thu': 3, 'friday': 4, 'fri': 4,
+    'saturday': 5, 'sat': 5, 'sunday': 6, 'sun': 6
+}
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
+    'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
+    'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
+}
+# Longest names first so "january" wins over "jan" and "tuesday" over "tue"
+_RE_WEEKDAY = re.compile(r'\b(next\s+)?(' + '|'.join(sorted(WEEKDAYS, key=len, reverse=True)) + r')\b')
+_RE_MONTH = re.compile(r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\b')
+_RE_DAY = re.compile(r'\b(\d{1,2})\b')
+_RE_YEAR = re.compile(r'\b(20\d{2})\b')
+_RE_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_RE_MDY = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$')
+
 def parse_natural_date(date_input: str) -> str:
     """
     Parse natural language date input into YYYY-MM-DD format.
     Same function as in book_table.py for consistency.
     """
-    date_input = date_input.strip().lower()
-    today = datetime.now().date()
+    # Agent tool calls usually pass YYYY-MM-DD already
+    if _RE_ISO.match(date_input):
+        return date_input
+    
+    # Today is part of the cache key so relative dates never go stale across midnight
+    return _parse_natural_date(date_input.strip().lower(), datetime.now().date())
+
+@lru_cache(maxsize=1024)
+def _parse_natural_date(date_input: str, today: date) -> str:
+    """Cached worker for parse_natural_date (date_input is already stripped and lowercased)."""
     current_year = today.year
     
     # Handle relative dates
@@ -33,19 +76,14 @@ def parse_natural_date(date_input: str) -> str:
         return (today + timedelta(days=7)).strftime("%Y-%m-%d")
     
     # Handle "next [weekday]"
-    weekdays = {
-        'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-        'friday': 4, 'saturday': 5, 'sunday': 6
-    }
-    
-    for day_name, day_num in weekdays.items():
-        if f'next {day_name}' in date_input:
-            days_ahead = day_num - today.weekday()
+    weekday_match = _RE_WEEKDAY.search(date_input)
+    if weekday_match:
+        days_ahead = WEEKDAYS[weekday_match.group(2)] - today.weekday()
+        if weekday_match.group(1):
             if days_ahead <= 0:
                 days_ahead += 7
             return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
-        elif day_name in date_input and 'next' not in date_input:
-            days_ahead = day_num - today.weekday()
+        elif 'next' not in date_input:
             if days_ahead < 0:
                 days_ahead += 7
             elif days_ahead == 0:
@@ -53,61 +91,88 @@ def parse_natural_date(date_input: str) -> str:
             return (today + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
     
     # Handle month names with day numbers
-    months = {
-        'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
-        'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
-        'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sep': 9,
-        'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
-    }
-    
-    for month_name, month_num in months.items():
-        if month_name in date_input:
-            day_match = re.search(r'\b(\d{1,2})\b', date_input)
-            if day_match:
-                day = int(day_match.group(1))
-                year_match = re.search(r'\b(20\d{2})\b', date_input)
-                year = int(year_match.group(1)) if year_match else current_year
-                
-                try:
-                    parsed_date = datetime(year, month_num, day).date()
-                    if parsed_date < today:
-                        parsed_date = datetime(year + 1, month_num, day).date()
-                    return parsed_date.strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
-    
-    # Try dateutil parser
-    try:
-        if not re.search(r'\b20\d{2}\b', date_input):
-            date_input = f"{date_input} {current_year}"
-        
-        parsed_date = parser.parse(date_input, default=datetime(current_year, 1, 1)).date()
-        if parsed_date < today:
-            parsed_date = parser.parse(date_input, default=datetime(current_year + 1, 1, 1)).date()
-        
-        return parsed_date.strftime("%Y-%m-%d")
-    except:
-        pass
+    month_match = _RE_MONTH.search(date_input)
+    if month_match:
+        month_num = MONTHS[month_match.group(1)]
+        day_match = _RE_DAY.search(date_input)
+        if day_match:
+            day = int(day_match.group(1))
+            year_match = _RE_YEAR.search(date_input)
+            year = int(year_match.group(1)) if year_match else current_year
+            
+            try:
+                parsed_date = datetime(year, month_num, day).date()
+                if parsed_date < today:
+                    parsed_date = datetime(year + 1, month_num, day).date()
+                return parsed_date.strftime("%Y-%m-%d")
+            except ValueError:
+                pass
     
-    # Check if already in YYYY-MM-DD format
-    if re.match(r'^\d{4}-\d{2}-\d{2}$', date_input):
+    # Check if already in YYYY-MM-DD format (e.g. with surrounding whitespace)
+    if _RE_ISO.match(date_input):
         return date_input
     
     # Check MM/DD format
-    date_match = re.match(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?$', date_input)
+    date_match = _RE_MDY.match(date_input)
     if date_match:
-        month, day, year = date_match.groups()
-        year = int(year) if year else current_year
+        month, day, year_given = date_match.groups()
+        year = int(year_given) if year_given else current_year
         try:
             parsed_date = datetime(year, int(month), int(day)).date()
-            if parsed_date < today and not year:
+            if parsed_date < today and not year_given:
                 parsed_date = datetime(year + 1, int(month), int(day)).date()
             return parsed_date.strftime("%Y-%m-%d")
         except ValueError:
             pass
     
+    # Try dateutil parser last; it is only imported once an input needs it
+    try:
+        from dateutil import parser
+        
+        dateutil_input = date_input
+        if not _RE_YEAR.search(dateutil_input):
+            dateutil_input = f"{dateutil_input} {current_year}"
+        
+        parsed_date = parser.parse(dateutil_input, default=datetime(current_year, 1, 1)).date()
+        if parsed_date < today:
+            parsed_date = parser.parse(dateutil_input, default=datetime(current_year + 1, 1, 1)).date()
+        
+        return parsed_date.strftime("%Y-%m-%d")
+    except:
+        pass
+    
     raise ValueError(f"Unable to parse date: '{date_input}'. Please try formats like 'tomorrow', 'next Friday', 'August 15', or 'YYYY-MM-DD'.")
 
+# Per-date slot totals, shared by every availability check for 30 seconds;
+# booking writes invalidate their date so staleness only covers other processes
+slot_totals_cache = TTLCache(maxsize=256, ttl=30)
+slot_totals_lock = threading.Lock()
+
+def get_slot_totals(date: str) -> dict[str, tuple[int, int]]:
+    """
+    Return (guests booked, tables booked) per HH:MM slot for a date in one query.
+    
+    Reads the trigger-maintained booking_slots aggregate (see booking-slots.sql).
+    """
+    with slot_totals_lock:
+        cached = slot_totals_cache.get(date)
+    if cached is not None:
+        return cached
+    
+    slots = supabase.table("booking_slots").select("time,guests_sum,table_count").eq("date", date).execute()
+    totals = {str(slot["time"])[:5]: (slot["guests_sum"], slot["table_count"]) for slot in slots.data or []}
+    with slot_totals_lock:
+        slot_totals_cache[date] = totals
+    return totals
+
+def invalidate_slot_totals(*dates: str) -> None:
+    """Drop cached slot totals for the given dates (all dates when none are given)"""
+    with slot_totals_lock:
+        if not dates:
+            slot_totals_cache.clear()
+        for date in dates:
+            slot_totals_cache.pop(str(date), None)
+
 @tool
 def check_table_availability(date: str, time: str = None, party_size: int = None) -> str:
     """
@@ -153,49 +218,41 @@ def check_table_availability(date: str, time: str = None, party_size: int = None
 def check_specific_time_availability(date: str, time: str, party_size: int = None) -> str:
     """Check availability for a specific date and time."""
     try:
-        # Get existing reservations for this time slot
-        existing_reservations = supabase.table("bookings").select("*").eq("date", date).eq("time", time).execute()
+        # One query returns every slot of the day; alternatives below reuse it
+        slot_totals = get_slot_totals(date)
         
-        # Configuration from environment variables
-        MAX_TABLES = int(os.getenv('MAX_TABLES', '10'))
-        MAX_CAPACITY = int(os.getenv('MAX_CAPACITY_PER_TIME_SLOT', '50'))
+        total_guests, tables_booked = slot_totals.get(time, (0, 0))
         
-        total_guests = 0
-        tables_booked = 0
-        
-        if existing_reservations.data:
-            total_guests = sum(reservation.get("guests", 0) for reservation in existing_reservations.data)
-            tables_booked = len(existing_reservations.data)
-        
-        available_capacity = MAX_CAPACITY - total_guests
+        available_capacity = MAX_CAPACITY_PER_TIME_SLOT - total_guests
         available_tables = MAX_TABLES - tables_booked
         
-        result = f"📅 Availability for {date} at {time}:\n\n"
+        status_line = f"📊 Current status: {total_guests}/{MAX_CAPACITY_PER_TIME_SLOT} guests, {tables_booked}/{MAX_TABLES} tables booked"
+        parts = [f"📅 Availability for {date} at {time}:", ""]
         
         if party_size:
             if available_capacity >= party_size and available_tables > 0:
-                result += f"✅ Available! We can accommodate your party of {party_size} people.\n"
-                result += f"📊 Current status: {total_guests}/{MAX_CAPACITY} guests, {tables_booked}/{MAX_TABLES} tables booked\n"
+                parts.append(f"✅ Available! We can accommodate your party of {party_size} people.")
+                parts.append(status_line)
             else:
-                result += f"❌ Not available for {party_size} people.\n"
-                result += f"📊 Current status: {total_guests}/{MAX_CAPACITY} guests, {tables_booked}/{MAX_TABLES} tables booked\n"
+                parts.append(f"❌ Not available for {party_size} people.")
+                parts.append(status_line)
                 
                 if available_capacity > 0 and available_tables > 0:
-                    result += f"💡 We can accommodate up to {min(available_capacity, 20)} people at this time.\n"
+                    parts.append(f"💡 We can accommodate up to {min(available_capacity, 20)} people at this time.")
                 
                 # Get alternative suggestions
-                alternatives = get_alternative_times_for_availability(date, time, party_size)
+                alternatives = get_alternative_times_for_availability(date, time, party_size, slot_totals)
                 if alternatives:
-                    result += f"\n📅 Alternative times available:\n" + "\n".join(alternatives)
+                    parts += ["", "📅 Alternative times available:", *alternatives]
         else:
             if available_tables > 0:
-                result += f"✅ Available! We have {available_tables} tables free.\n"
-                result += f"📊 Current capacity: {available_capacity} people available (max {min(available_capacity, 20)} per table)\n"
+                parts.append(f"✅ Available! We have {available_tables} tables free.")
+                parts.append(f"📊 Current capacity: {available_capacity} people available (max {min(available_capacity, 20)} per table)")
             else:
-                result += f"❌ Fully booked at this time.\n"
-                result += f"📊 All {MAX_TABLES} tables are reserved\n"
+                parts.append("❌ Fully booked at this time.")
+                parts.append(f"📊 All {MAX_TABLES} tables are reserved")
         
-        return result
+        return "\n".join(parts)
         
     except Exception as e:
         return f"Error checking specific time availability: {str(e)}"
@@ -203,40 +260,25 @@ def check_specific_time_availability(date: str, time: str, party_size: int = Non
 def show_daily_availability(date: str, party_size: int = None) -> str:
     """Show availability overview for the entire day."""
     try:
-        # Get all reservations for the date
-        all_reservations = supabase.table("bookings").select("*").eq("date", date).execute()
-        
-        # Group reservations by time
-        reservations_by_time = {}
-        if all_reservations.data:
-            for reservation in all_reservations.data:
-                time_slot = reservation.get("time", "")
-                if time_slot not in reservations_by_time:
-                    reservations_by_time[time_slot] = []
-                reservations_by_time[time_slot].append(reservation)
-        
-        result = f"📅 Daily Availability Overview for {date}:\n\n"
+        # Get per-slot totals for the date
+        slot_totals = get_slot_totals(date)
         
         # Check each hour from 10 AM to 10 PM
         available_slots = []
         busy_slots = []
         
-        for hour in range(10, 23):
-            time_slot = f"{hour:02d}:00"
-            
-            if time_slot in reservations_by_time:
-                reservations = reservations_by_time[time_slot]
-                total_guests = sum(r.get("guests", 0) for r in reservations)
-                tables_booked = len(reservations)
+        for time_slot in TIME_SLOTS:
+            if time_slot in slot_totals:
+                total_guests, tables_booked = slot_totals[time_slot]
                 
-                available_capacity = 50 - total_guests
-                available_tables = 10 - tables_booked
+                available_capacity = MAX_CAPACITY_PER_TIME_SLOT - total_guests
+                available_tables = MAX_TABLES - tables_booked
                 
                 if party_size:
                     if available_capacity >= party_size and available_tables > 0:
                         available_slots.append(f"✅ {time_slot} - Available for {party_size} people")
                     else:
-                        busy_slots.append(f"❌ {time_slot} - Busy ({total_guests}/50 guests, {tables_booked}/10 tables)")
+                        busy_slots.append(f"❌ {time_slot} - Busy ({total_guests}/{MAX_CAPACITY_PER_TIME_SLOT} guests, {tables_booked}/{MAX_TABLES} tables)")
                 else:
                     if available_tables > 0:
                         available_slots.append(f"✅ {time_slot} - {available_tables} tables, {available_capacity} people capacity")
@@ -247,53 +289,46 @@ def show_daily_availability(date: str, party_size: int = None) -> str:
                 if party_size:
                     available_slots.append(f"✅ {time_slot} - Available for {party_size} people")
                 else:
-                    available_slots.append(f"✅ {time_slot} - Fully available (10 tables, 50 people capacity)")
+                    available_slots.append(f"✅ {time_slot} - Fully available ({MAX_TABLES} tables, {MAX_CAPACITY_PER_TIME_SLOT} people capacity)")
         
+        parts = [f"📅 Daily Availability Overview for {date}:", ""]
         if available_slots:
-            result += "🟢 Available Time Slots:\n" + "\n".join(available_slots)
+            parts += ["🟢 Available Time Slots:", *available_slots]
         else:
-            result += "❌ No available time slots"
+            parts.append("❌ No available time slots")
             
         if busy_slots:
-            result += f"\n\n🔴 Busy Time Slots:\n" + "\n".join(busy_slots)
+            parts += ["", "🔴 Busy Time Slots:", *busy_slots]
         
-        result += f"\n\n💡 To book a table, use: 'book a table for [X] people on {date} at [time] under [name]'"
+        parts += ["", f"💡 To book a table, use: 'book a table for [X] people on {date} at [time] under [name]'"]
         
-        return result
+        return "\n".join(parts)
         
     except Exception as e:
         return f"Error showing daily availability: {str(e)}"
 
-def get_alternative_times_for_availability(date: str, requested_time: str, party_size: int) -> list:
-    """Get alternative available time slots."""
+def get_alternative_times_for_availability(date: str, requested_time: str, party_size: int, slot_totals: dict = None) -> list:
+    """Get alternative available time slots (slot_totals from get_slot_totals is reused if given)."""
     try:
         suggestions = []
         requested_hour = int(requested_time.split(':')[0])
         
-        # Generate time slots (every hour from 10 AM to 10 PM)
-        time_slots = [f"{hour:02d}:00" for hour in range(10, 23)]
+        if slot_totals is None:
+            slot_totals = get_slot_totals(date)
         
-        for time_slot in time_slots:
+        for hour, time_slot in zip(TIME_SLOT_HOURS, TIME_SLOTS):
             if time_slot == requested_time:
                 continue
-                
-            existing_reservations = supabase.table("bookings").select("*").eq("date", date).eq("time", time_slot).execute()
             
-            total_guests_booked = 0
-            tables_booked = 0
+            total_guests_booked, tables_booked = slot_totals.get(time_slot, (0, 0))
             
-            if existing_reservations.data:
-                total_guests_booked = sum(reservation.get("guests", 0) for reservation in existing_reservations.data)
-                tables_booked = len(existing_reservations.data)
-            
-            if (total_guests_booked + party_size <= 50 and tables_booked < 10):
-                hour_diff = abs(int(time_slot.split(':')[0]) - requested_hour)
+            if (total_guests_booked + party_size <= MAX_CAPACITY_PER_TIME_SLOT and tables_booked < MAX_TABLES):
+                hour_diff = abs(hour - requested_hour)
                 suggestions.append((hour_diff, f"✅ {time_slot} - Available for {party_size} people"))
         
-        # Sort by time difference and return top 3 suggestions
-        suggestions.sort(key=lambda x: x[0])
-        return [suggestion[1] for suggestion in suggestions[:3]]
+        # Return the 3 suggestions closest to the requested time
+        return [suggestion[1] for suggestion in heapq.nsmallest(3, suggestions, key=itemgetter(0))]
         
-    except Exception as e:
-        print(f"DEBUG: Error getting alternative times: {str(e)}")
+    except Exception:
+        logger.exception("Error getting alternative times")
         return []
@@ -1,23 +1,39 @@
 import os
-import sys
+import re
+import threading
 from langchain.tools import tool
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-
-# Add the src directory to the path to import db module
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from .pdf_vectorstore import EMBEDDING_DIMENSIONS, build_pdf_vectorstore, read_fingerprint
+from .tool_cache import SemanticSearchCache, ttl_cached
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the vectorstore globally
+# The vectorstore is built (or loaded from disk) on the first FAQ question, not at import
 vectorstore = None
 
-def initialize_faq_vectorstore():
-    """Initialize the FAQ vectorstore from PDF"""
+# Embedded FAQ chunks are persisted here and reused until the PDF changes
+FAQ_CHROMA_DIR = os.getenv('FAQ_CHROMA_DIR') or os.path.join(os.path.dirname(__file__), '..', '..', '.faq_chroma')
+
+# The collection name carries the embedding size so an index built with other settings is never reused
+FAQ_COLLECTION = f"restaurant_faq_{EMBEDDING_DIMENSIONS}"
+FAQ_COLLECTION_METADATA = {"hnsw:space": "cosine", "hnsw:M": 16, "hnsw:construction_ef": 100}
+
+# Chunks beyond this cosine distance are unrelated to the question (text-embedding-3
+# puts on-topic pairs well under it), so the keyword fallback answers instead
+FAQ_MAX_DISTANCE = 0.75
+
+# Paraphrased FAQ questions reuse an earlier search (persisted across restarts) instead of querying Chroma again
+faq_search_cache = SemanticSearchCache(threshold=0.95, namespace="faq")
+
+# First line of every answer found in the FAQ PDF (only these are cached)
+FAQ_ANSWER_PREFIX = "📋 **From our FAQ:**"
+
+# Appended to FAQ answers too short to be complete
+FAQ_SHORT_ANSWER_NOTE = "\n\n💡 For more detailed information, please call us at (555) 123-4567."
+
+def initialize_faq_vectorstore(rebuild: bool = False):
+    """Initialize the FAQ vectorstore, re-embedding the PDF only when its contents changed"""
     global vectorstore
     
     try:
@@ -32,37 +48,33 @@ def initialize_faq_vectorstore():
             print(f"⚠️ FAQ PDF not found at: {pdf_path}")
             return None
         
-        # Load PDF documents
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n\n", "\n", " ", ""],
-            chunk_size=1000, 
-            chunk_overlap=100
+        previous_fingerprint = read_fingerprint(FAQ_CHROMA_DIR, FAQ_COLLECTION)
+        vectorstore = build_pdf_vectorstore(
+            pdf_path, FAQ_COLLECTION, FAQ_CHROMA_DIR,
+            chunk_size=1500, chunk_overlap=0,
+            collection_metadata=FAQ_COLLECTION_METADATA, rebuild=rebuild
         )
-        faq_chunks = text_splitter.split_documents(documents)
-        
-        # Create embeddings and vectorstore
-        embeddings = OpenAIEmbeddings()
-        vectorstore = Chroma.from_documents(
-            faq_chunks, 
-            embeddings, 
-            collection_name="restaurant_faq"
-        )
-        
-        print(f"[SUCCESS] FAQ vectorstore initialized with {len(faq_chunks)} chunks")
+        # Persisted searches answered from the old PDF are stale once it is re-embedded
+        if rebuild or read_fingerprint(FAQ_CHROMA_DIR, FAQ_COLLECTION) != previous_fingerprint:
+            faq_search_cache.clear()
         return vectorstore
         
     except Exception as e:
         print(f"[ERROR] Error initializing FAQ vectorstore: {str(e)}")
         return None
 
-# Initialize vectorstore on module load
-vectorstore = initialize_faq_vectorstore()
+_vectorstore_lock = threading.Lock()
+
+def get_faq_vectorstore():
+    """Return the FAQ vectorstore, initializing it once on first use (None if unavailable)"""
+    if vectorstore is None:
+        with _vectorstore_lock:
+            if vectorstore is None:
+                initialize_faq_vectorstore()
+    return vectorstore
 
 @tool
+@ttl_cached(ttl=3600, maxsize=512, cache_if=lambda answer: answer.startswith(FAQ_ANSWER_PREFIX))
 def restaurant_faq(question: str) -> str:
     """
     Answer frequently asked questions about the restaurant by searching through
@@ -76,35 +88,20 @@ def restaurant_faq(question: str) -> str:
         str: Answer to the question from the FAQ document
     """
     try:
-        global vectorstore
-        
-        # Check if vectorstore is available
-        if vectorstore is None:
-            # Try to reinitialize
-            vectorstore = initialize_faq_vectorstore()
-            if vectorstore is None:
-                return get_fallback_faq_response(question)
+        # Load the vectorstore on first use
+        store = get_faq_vectorstore()
+        if store is None:
+            return get_fallback_faq_response(question)
         
         # Perform semantic search
         try:
-            # Search for relevant documents
-            relevant_docs = vectorstore.similarity_search(
-                question, 
-                k=3  # Get top 3 most relevant chunks
-            )
+            # Search for the top 3 most relevant chunks, combined into one string
+            combined_content = faq_search_cache.search(store, question, k=3, max_distance=FAQ_MAX_DISTANCE)
             
-            if relevant_docs:
-                # Combine the relevant content
-                combined_content = "\n\n".join([doc.page_content for doc in relevant_docs])
-                
-                # Format the response
-                response = f"📋 **From our FAQ:**\n\n{combined_content}"
-                
-                # Add contact info if response seems incomplete
-                if len(combined_content) < 100:
-                    response += "\n\n💡 For more detailed information, please call us at (555) 123-4567."
-                
-                return response
+            if combined_content:
+                # Format the response in one pass, adding contact info if it seems incomplete
+                note = FAQ_SHORT_ANSWER_NOTE if len(combined_content) < 100 else ""
+                return f"{FAQ_ANSWER_PREFIX}\n\n{combined_content}{note}"
             else:
                 return get_fallback_faq_response(question)
                 
@@ -116,85 +113,87 @@ def restaurant_faq(question: str) -> str:
         print(f"FAQ tool error: {str(e)}")
         return "I apologize, but I'm having trouble accessing the FAQ information right now. Please contact us directly at (555) 123-4567 for immediate assistance."
 
-def get_fallback_faq_response(question: str) -> str:
-    """Provide fallback responses when vectorstore is not available"""
-    
-    question_lower = question.lower()
-    
-    # Simple keyword-based fallback responses
-    if any(word in question_lower for word in ['hours', 'open', 'close', 'time']):
-        return """🕐 **Restaurant Hours:**
+# Fallback answer categories and their keywords, checked in priority order
+FAQ_FALLBACK_KEYWORDS = tuple(
+    (name, re.compile("|".join(words), re.IGNORECASE)) for name, words in (
+        ("hours", ('hours', 'open', 'close', 'time')),
+        ("policy", ('policy', 'cancel', 'change', 'modify')),
+        ("location", ('location', 'address', 'parking', 'where')),
+        ("menu", ('menu', 'food', 'dietary', 'vegan', 'vegetarian', 'gluten')),
+        ("dress", ('dress', 'attire', 'clothing', 'wear')),
+        ("payment", ('payment', 'pay', 'credit', 'cash', 'tip')),
+        ("contact", ('contact', 'phone', 'email', 'call')),
+        ("events", ('events', 'party', 'birthday', 'private', 'celebration')),
+    )
+)
+
+# Canned FAQ answers for each fallback category
+FAQ_FALLBACK_RESPONSES = {
+    "hours": """🕐 **Restaurant Hours:**
         
 Monday - Thursday: 10:00 AM - 11:00 PM
 Friday - Saturday: 10:00 AM - 12:00 AM (Midnight)
 Sunday: 10:00 AM - 10:00 PM
 
-We accept reservations during all operating hours. Last seating is 30 minutes before closing time."""
-    
-    elif any(word in question_lower for word in ['policy', 'cancel', 'change', 'modify']):
-        return """📋 **Reservation Policy:**
+We accept reservations during all operating hours. Last seating is 30 minutes before closing time.""",
+
+    "policy": """📋 **Reservation Policy:**
 
 • Reservations can be made up to 30 days in advance
 • We accommodate parties of 1-20 people  
 • Free changes up to 2 hours before your reservation
 • Free cancellation up to 2 hours before your reservation
 • No-show fees may apply for parties of 8 or more
-• Parties over 20 people require special arrangements"""
-    
-    elif any(word in question_lower for word in ['location', 'address', 'parking', 'where']):
-        return """📍 **Location & Parking:**
+• Parties over 20 people require special arrangements""",
+
+    "location": """📍 **Location & Parking:**
 
 • Address: 123 Main Street, Downtown City, State 12345
 • Parking: Complimentary valet parking available
 • Public Transit: 2 blocks from Central Station
 • Nearby Landmarks: Across from City Hall, next to Grand Theater
-• Accessibility: Wheelchair accessible entrance and restrooms"""
-    
-    elif any(word in question_lower for word in ['menu', 'food', 'dietary', 'vegan', 'vegetarian', 'gluten']):
-        return """🍽️ **Menu & Dietary Information:**
+• Accessibility: Wheelchair accessible entrance and restrooms""",
+
+    "menu": """🍽️ **Menu & Dietary Information:**
 
 • Cuisine: Modern American with international influences
 • Dietary Options: Vegetarian, vegan, and gluten-free options available
 • Allergies: Please inform us of any allergies when booking or upon arrival
 • Kids Menu: Children's menu available for ages 12 and under
-• Price Range: $25-45 per entree, $8-15 appetizers"""
-    
-    elif any(word in question_lower for word in ['dress', 'attire', 'clothing', 'wear']):
-        return """👔 **Dress Code:**
+• Price Range: $25-45 per entree, $8-15 appetizers""",
+
+    "dress": """👔 **Dress Code:**
 
 • Smart Casual is our preferred dress code
 • Acceptable: Business casual, nice jeans with dress shirt, dresses, slacks
 • Not Recommended: Athletic wear, flip-flops, tank tops, torn clothing
-• Special Events: Formal attire may be required for special occasions"""
-    
-    elif any(word in question_lower for word in ['payment', 'pay', 'credit', 'cash', 'tip']):
-        return """💳 **Payment & Gratuity:**
+• Special Events: Formal attire may be required for special occasions""",
+
+    "payment": """💳 **Payment & Gratuity:**
 
 • Payment Methods: We accept all major credit cards, cash, and contactless payments
 • Gratuity: 18% gratuity is automatically added to parties of 8 or more
 • Split Bills: We can accommodate split payments for up to 4 cards
-• Gift Cards: Restaurant gift cards available for purchase"""
-    
-    elif any(word in question_lower for word in ['contact', 'phone', 'email', 'call']):
-        return """📞 **Contact Information:**
+• Gift Cards: Restaurant gift cards available for purchase""",
+
+    "contact": """📞 **Contact Information:**
 
 • Phone: (555) 123-4567
 • Email: reservations@restaurant.com
 • Website: www.restaurant.com
 • Social Media: @RestaurantName on Instagram, Facebook, Twitter
-• Hours for Calls: Monday-Sunday, 9:00 AM - 9:00 PM"""
-    
-    elif any(word in question_lower for word in ['events', 'party', 'birthday', 'private', 'celebration']):
-        return """🎉 **Special Events & Private Dining:**
+• Hours for Calls: Monday-Sunday, 9:00 AM - 9:00 PM""",
+
+    "events": """🎉 **Special Events & Private Dining:**
 
 • Private Dining Room: Available for groups of 15-40 people
 • Birthday Celebrations: Complimentary dessert with advance notice
 • Anniversary Packages: Special menu and wine pairings available
 • Corporate Events: Business lunch and dinner packages
-• Catering: Off-site catering available for events"""
-    
-    else:
-        return """❓ **I'd be happy to help!** 
+• Catering: Off-site catering available for events""",
+}
+
+FAQ_FALLBACK_DEFAULT = """❓ **I'd be happy to help!** 
 
 I can provide information about:
 
@@ -209,9 +208,16 @@ I can provide information about:
 
 Please ask me about any of these topics, or contact us directly at (555) 123-4567 for immediate assistance."""
 
+def get_fallback_faq_response(question: str) -> str:
+    """Provide fallback responses when vectorstore is not available"""
+    
+    category = next((name for name, pattern in FAQ_FALLBACK_KEYWORDS if pattern.search(question)), None)
+    return FAQ_FALLBACK_RESPONSES.get(category, FAQ_FALLBACK_DEFAULT)
+
 def reload_faq_vectorstore():
     """Reload the FAQ vectorstore (useful after PDF updates)"""
     global vectorstore
-    vectorstore = initialize_faq_vectorstore()
+    vectorstore = initialize_faq_vectorstore(rebuild=True)
+    restaurant_faq.func.cache_clear()
     return "FAQ vectorstore reloaded successfully!" if vectorstore else "Failed to reload FAQ vectorstore."
     
\ No newline at end of file
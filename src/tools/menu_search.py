@@ -1,23 +1,38 @@
 import os
-import sys
+import re
+import threading
 from langchain.tools import tool
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-
-# Add the src directory to the path to import db module
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from .pdf_vectorstore import EMBEDDING_DIMENSIONS, build_pdf_vectorstore, read_fingerprint
+from .tool_cache import SemanticSearchCache, ttl_cached
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the menu vectorstore globally
+# The menu vectorstore is built (or loaded from disk) on the first menu question, not at import
 menu_vectorstore = None
 
-def initialize_menu_vectorstore():
-    """Initialize the menu vectorstore from PDF"""
+# Embedded menu chunks are persisted here and reused until the PDF changes
+MENU_CHROMA_DIR = os.getenv('MENU_CHROMA_DIR') or os.path.join(os.path.dirname(__file__), '..', '..', '.menu_chroma')
+# The collection name carries the embedding size so an index built with other settings is never reused
+MENU_COLLECTION = f"menu_{EMBEDDING_DIMENSIONS}"
+MENU_COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Chunks beyond this cosine distance are unrelated to the query, so the keyword fallback answers instead
+MENU_MAX_DISTANCE = 0.75
+
+# Paraphrased menu queries reuse an earlier search, persisted across restarts (k differs, so one cache per tool)
+menu_search_cache = SemanticSearchCache(threshold=0.95, namespace="menu")
+recommendations_search_cache = SemanticSearchCache(threshold=0.95, namespace="menu_rec")
+
+# Start of every result found in the menu PDF (only these are cached)
+MENU_RESULTS_PREFIX = "🍽️ **Menu Search Results for: "
+
+# Appended to menu search results too short to be complete
+MENU_SHORT_ANSWER_NOTE = "\n\n💡 For more detailed menu information, please ask your server or call us at (555) 123-4567."
+
+def initialize_menu_vectorstore(rebuild: bool = False):
+    """Initialize the menu vectorstore, re-embedding the PDF only when its contents changed"""
     global menu_vectorstore
     
     try:
@@ -32,36 +47,34 @@ def initialize_menu_vectorstore():
             print(f"⚠️ Menu PDF not found at: {pdf_path}")
             return None
         
-        # Load PDF documents
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n\n", "\n", " ", ""],
-            chunk_size=800, 
-            chunk_overlap=50
+        previous_fingerprint = read_fingerprint(MENU_CHROMA_DIR, MENU_COLLECTION)
+        menu_vectorstore = build_pdf_vectorstore(
+            pdf_path, MENU_COLLECTION, MENU_CHROMA_DIR,
+            chunk_size=1200, chunk_overlap=0,
+            collection_metadata=MENU_COLLECTION_METADATA, rebuild=rebuild
         )
-        menu_chunks = text_splitter.split_documents(documents)
-        
-        # Create embeddings and vectorstore
-        embeddings = OpenAIEmbeddings()
-        menu_vectorstore = Chroma.from_documents(
-            menu_chunks, 
-            embeddings, 
-            collection_name="menu"
-        )
-        
-        print(f"[SUCCESS] Menu vectorstore initialized with {len(menu_chunks)} chunks")
+        # Persisted searches answered from the old menu are stale once it is re-embedded
+        if rebuild or read_fingerprint(MENU_CHROMA_DIR, MENU_COLLECTION) != previous_fingerprint:
+            menu_search_cache.clear()
+            recommendations_search_cache.clear()
         return menu_vectorstore
         
     except Exception as e:
         print(f"[ERROR] Error initializing menu vectorstore: {str(e)}")
         return None
 
-# Initialize vectorstore on module load
-menu_vectorstore = initialize_menu_vectorstore()
+_menu_vectorstore_lock = threading.Lock()
+
+def get_menu_vectorstore():
+    """Return the menu vectorstore, initializing it once on first use (None if unavailable)"""
+    if menu_vectorstore is None:
+        with _menu_vectorstore_lock:
+            if menu_vectorstore is None:
+                initialize_menu_vectorstore()
+    return menu_vectorstore
+
 @tool
+@ttl_cached(ttl=3600, cache_if=lambda answer: answer.startswith(MENU_RESULTS_PREFIX))
 def menu_search(query: str) -> str:
     """
     Search the restaurant menu by dish name, ingredients, dietary preferences, or cuisine type.
@@ -74,36 +87,20 @@ def menu_search(query: str) -> str:
         str: Menu items matching the search criteria with details
     """
     try:
-        global menu_vectorstore
-        
-        # Check if vectorstore is available
-        if menu_vectorstore is None:
-            # Try to reinitialize
-            menu_vectorstore = initialize_menu_vectorstore()
-            if menu_vectorstore is None:
-                return get_fallback_menu_response(query)
+        # Load the vectorstore on first use
+        store = get_menu_vectorstore()
+        if store is None:
+            return get_fallback_menu_response(query)
         
         # Perform semantic search
         try:
-            # Search for relevant menu items
-            relevant_items = menu_vectorstore.similarity_search(
-                query,
-                k=4  # Get top 4 most relevant items
-            )
+            # Search for the top 4 most relevant menu items, combined into one string
+            combined_content = menu_search_cache.search(store, query, k=4, max_distance=MENU_MAX_DISTANCE)
             
-            if relevant_items:
-                # Combine the relevant content
-                combined_content = "\n\n".join([doc.page_content for doc in relevant_items])
-                
-                # Format the response
-                response = f"🍽️ **Menu Search Results for: '{query}'**\n\n"
-                response += f"📋 **From our Menu:**\n\n{combined_content}"
-                
-                # Add helpful note
-                if len(combined_content) < 100:
-                    response += "\n\n💡 For more detailed menu information, please ask your server or call us at (555) 123-4567."
-                
-                return response
+            if combined_content:
+                # Format the response in one pass, adding a helpful note to short results
+                note = MENU_SHORT_ANSWER_NOTE if len(combined_content) < 100 else ""
+                return f"{MENU_RESULTS_PREFIX}'{query}'**\n\n📋 **From our Menu:**\n\n{combined_content}{note}"
             else:
                 return get_fallback_menu_response(query)
                 
@@ -128,36 +125,24 @@ def menu_recommendations(preferences: str) -> str:
         str: Personalized menu recommendations with explanations
     """
     try:
-        global menu_vectorstore
-        
-        # Check if vectorstore is available
-        if menu_vectorstore is None:
-            # Try to reinitialize
-            menu_vectorstore = initialize_menu_vectorstore()
-            if menu_vectorstore is None:
-                return get_fallback_recommendations(preferences)
+        # Load the vectorstore on first use
+        store = get_menu_vectorstore()
+        if store is None:
+            return get_fallback_recommendations(preferences)
         
         # Perform semantic search based on preferences
         try:
-            # Search for relevant menu items based on preferences
-            relevant_items = menu_vectorstore.similarity_search(
-                preferences,
-                k=5  # Get top 5 most relevant items
-            )
+            # Pick 5 diverse menu items matching the preferences (MMR over the 15 closest), combined into one string
+            combined_content = recommendations_search_cache.search(store, preferences, k=5, mmr_fetch_k=15)
             
-            if relevant_items:
-                # Combine the relevant content
-                combined_content = "\n\n".join([doc.page_content for doc in relevant_items])
-                
-                # Format the response
-                response = f"👨‍🍳 **Personalized Recommendations for: '{preferences}'**\n\n"
-                response += f"📋 **Based on our Menu:**\n\n{combined_content}"
-                
-                # Add personalized note
-                response += f"\n\n💡 **These recommendations are tailored to your preferences: '{preferences}'**"
-                response += "\n🍽️ Would you like more details about any of these dishes or need assistance with dietary requirements?"
-                
-                return response
+            if combined_content:
+                # Format the response with a personalized note in one pass
+                return (
+                    f"👨‍🍳 **Personalized Recommendations for: '{preferences}'**\n\n"
+                    f"📋 **Based on our Menu:**\n\n{combined_content}"
+                    f"\n\n💡 **These recommendations are tailored to your preferences: '{preferences}'**"
+                    "\n🍽️ Would you like more details about any of these dishes or need assistance with dietary requirements?"
+                )
             else:
                 return get_fallback_recommendations(preferences)
                 
@@ -169,13 +154,20 @@ def menu_recommendations(preferences: str) -> str:
         print(f"Recommendations error: {str(e)}")
         return "I apologize, but I'm having trouble generating recommendations right now. Please ask your server for personalized suggestions."
 
-def get_fallback_menu_response(query: str) -> str:
-    """Provide fallback menu responses when vectorstore is not available"""
-    
-    query_lower = query.lower()
-    
-    if any(word in query_lower for word in ['vegetarian', 'veggie', 'vegan']):
-        return """🌱 **Vegetarian & Vegan Options:**
+# Fallback answer categories and their keywords, checked in priority order
+MENU_FALLBACK_KEYWORDS = tuple(
+    (name, re.compile("|".join(words), re.IGNORECASE)) for name, words in (
+        ("vegetarian", ('vegetarian', 'veggie', 'vegan')),
+        ("seafood", ('seafood', 'fish', 'salmon', 'lobster', 'scallop')),
+        ("meat", ('meat', 'beef', 'steak', 'lamb')),
+        ("dessert", ('dessert', 'sweet', 'chocolate')),
+        ("drinks", ('drink', 'wine', 'cocktail', 'beverage')),
+    )
+)
+
+# Canned menu answers for each fallback category
+MENU_FALLBACK_RESPONSES = {
+    "vegetarian": """🌱 **Vegetarian & Vegan Options:**
 
 **Appetizers:**
 • Vegan Spring Rolls - $14 (V, GF)
@@ -188,10 +180,9 @@ def get_fallback_menu_response(query: str) -> str:
 **Desserts:**
 • Vegan Cheesecake - $10 (Cashew-based with berry compote)
 
-*V = Vegan, GF = Gluten-Free*"""
-    
-    elif any(word in query_lower for word in ['seafood', 'fish', 'salmon', 'lobster', 'scallop']):
-        return """🐟 **Seafood Selections:**
+*V = Vegan, GF = Gluten-Free*""",
+
+    "seafood": """🐟 **Seafood Selections:**
 
 **Appetizers:**
 • Seared Scallops - $18 (Pan-seared with cauliflower puree)
@@ -201,10 +192,9 @@ def get_fallback_menu_response(query: str) -> str:
 • Pan-Seared Salmon - $32 (Atlantic salmon with quinoa pilaf)
 • Lobster Thermidor - $45 (Whole lobster with cream sauce)
 
-All seafood is sourced daily for optimal freshness."""
-    
-    elif any(word in query_lower for word in ['meat', 'beef', 'steak', 'lamb']):
-        return """🥩 **Premium Meats:**
+All seafood is sourced daily for optimal freshness.""",
+
+    "meat": """🥩 **Premium Meats:**
 
 **Mains:**
 • Wagyu Ribeye - $65 (12oz premium wagyu with roasted vegetables)
@@ -212,10 +202,9 @@ All seafood is sourced daily for optimal freshness."""
 • Duck Confit - $34 (Slow-cooked duck leg with wild rice)
 • Lamb Rack - $42 (Herb-crusted with ratatouille)
 
-All meats are sourced from premium suppliers and prepared to your preference."""
-    
-    elif any(word in query_lower for word in ['dessert', 'sweet', 'chocolate']):
-        return """🍰 **Dessert Menu:**
+All meats are sourced from premium suppliers and prepared to your preference.""",
+
+    "dessert": """🍰 **Dessert Menu:**
 
 • Chocolate Lava Cake - $12 (Warm cake with molten center)
 • Tiramisu - $11 (Classic Italian with espresso)
@@ -223,20 +212,19 @@ All meats are sourced from premium suppliers and prepared to your preference."""
 • Crème Brûlée - $9 (Vanilla custard, gluten-free)
 • Seasonal Fruit Tart - $11 (Fresh seasonal fruits)
 
-Perfect ending to your dining experience!"""
-    
-    elif any(word in query_lower for word in ['drink', 'wine', 'cocktail', 'beverage']):
-        return """🍷 **Beverage Menu:**
+Perfect ending to your dining experience!""",
+
+    "drinks": """🍷 **Beverage Menu:**
 
 • **Wine Selection** ($8-25/glass) - Curated international wines
 • **Craft Cocktails** ($12-18) - House-crafted with premium spirits
 • **Fresh Juices** ($6-8) - Seasonal fruit juices
 • **Coffee & Espresso** ($4-6) - Premium coffee drinks
 
-Our sommelier can help pair wines with your meal."""
-    
-    else:
-        return """🍽️ **Our Menu Categories:**
+Our sommelier can help pair wines with your meal.""",
+}
+
+MENU_FALLBACK_DEFAULT = """🍽️ **Our Menu Categories:**
 
 **🥗 Appetizers** ($14-19)
 Start your meal with our signature starters
@@ -252,11 +240,14 @@ Wine, cocktails, and specialty drinks
 
 Ask me about specific items, dietary options, or recommendations!"""
 
-def get_fallback_recommendations(preferences: str) -> str:
-    """Provide fallback recommendations"""
-    return f"""👨‍🍳 **Based on '{preferences}', here are some popular choices:**
+def get_fallback_menu_response(query: str) -> str:
+    """Provide fallback menu responses when vectorstore is not available"""
+    
+    category = next((name for name, pattern in MENU_FALLBACK_KEYWORDS if pattern.search(query)), None)
+    return MENU_FALLBACK_RESPONSES.get(category, MENU_FALLBACK_DEFAULT)
 
-**🌟 Chef's Recommendations:**
+# Static part of the fallback recommendations; only the heading names the preferences
+FALLBACK_RECOMMENDATIONS = """**🌟 Chef's Recommendations:**
 • Pan-Seared Salmon ($32) - Our most popular seafood dish
 • Wagyu Ribeye ($65) - Premium beef experience
 • Vegetarian Pasta ($24) - Fresh, seasonal ingredients
@@ -268,8 +259,13 @@ def get_fallback_recommendations(preferences: str) -> str:
 
 Would you like specific details about any dish or dietary accommodations?"""
 
+def get_fallback_recommendations(preferences: str) -> str:
+    """Provide fallback recommendations"""
+    return f"👨‍🍳 **Based on '{preferences}', here are some popular choices:**\n\n{FALLBACK_RECOMMENDATIONS}"
+
 def reload_menu_vectorstore():
     """Reload the menu vectorstore (useful after menu updates)"""
     global menu_vectorstore
-    menu_vectorstore = initialize_menu_vectorstore()
+    menu_vectorstore = initialize_menu_vectorstore(rebuild=True)
+    menu_search.func.cache_clear()
     return "Menu vectorstore reloaded successfully!" if menu_vectorstore else "Failed to reload menu vectorstore."
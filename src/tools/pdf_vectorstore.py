@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+
+# One embeddings client (and HTTP connection pool) shared by the FAQ and menu stores.
+# Native 512-dim text-embedding-3-small vectors keep both indexes small; collection
+# names carry the size so an index built with other settings is never reused.
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 512
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings():
+    """Return the shared OpenAIEmbeddings client, creating it on first use"""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                _embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS)
+    return _embeddings
+
+def file_fingerprint(path: str) -> str:
+    """SHA-256 of a file's contents, used to tell whether a persisted index is stale"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def read_fingerprint(persist_dir: str, name: str) -> str:
+    """Return the fingerprint stored next to a persisted collection ("" if none)"""
+    try:
+        with open(os.path.join(persist_dir, f"{name}.sha256")) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def write_fingerprint(persist_dir: str, name: str, fingerprint: str) -> None:
+    """Record the source fingerprint a persisted collection was built from"""
+    with open(os.path.join(persist_dir, f"{name}.sha256"), "w") as f:
+        f.write(fingerprint)
+
+def build_pdf_vectorstore(pdf_path: str, collection_name: str, persist_dir: str, chunk_size: int,
+                          chunk_overlap: int, collection_metadata: dict = None, rebuild: bool = False):
+    """
+    Load a persisted Chroma collection for a PDF, re-embedding it only when the PDF
+    or its chunking settings changed.
+
+    Args:
+        pdf_path (str): Source PDF.
+        collection_name (str): Chroma collection (also names the fingerprint file).
+        persist_dir (str): Directory the collection is persisted in.
+        chunk_size (int): Text splitter chunk size in characters.
+        chunk_overlap (int): Overlap between consecutive chunks.
+        collection_metadata (dict, optional): HNSW settings for the collection.
+        rebuild (bool): Re-embed even if the persisted collection is current.
+
+    Returns:
+        Chroma: The ready vectorstore.
+    """
+    # Heavy LangChain/Chroma/PDF imports are deferred until a vectorstore is actually needed
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from langchain_chroma import Chroma
+
+    # Chunking settings are part of the fingerprint, so changing them re-embeds too
+    pdf_hash = f"{file_fingerprint(pdf_path)}:{chunk_size}:{chunk_overlap}"
+    embeddings = get_embeddings()
+
+    persisted = Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=persist_dir,
+        collection_metadata=collection_metadata
+    )
+
+    # Reuse the persisted index when it is populated and was built from this exact PDF and chunking
+    if not rebuild and read_fingerprint(persist_dir, collection_name) == pdf_hash and persisted.get(limit=1)["ids"]:
+        print(f"[SUCCESS] {collection_name} vectorstore loaded from {persist_dir}")
+        return persisted
+
+    # Drop the stale collection so re-embedded chunks are not appended to it
+    persisted.delete_collection()
+
+    # Load PDF documents and split them into chunks
+    documents = PyMuPDFLoader(pdf_path).load()
+    text_splitter = RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", " ", ""],
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    chunks = text_splitter.split_documents(documents)
+
+    # Embed the chunks into the persisted collection and mark it as current
+    vectorstore = Chroma.from_documents(
+        chunks,
+        embeddings,
+        collection_name=collection_name,
+        persist_directory=persist_dir,
+        collection_metadata=collection_metadata
+    )
+    write_fingerprint(persist_dir, collection_name, pdf_hash)
+
+    print(f"[SUCCESS] {collection_name} vectorstore initialized with {len(chunks)} chunks")
+    return vectorstore
@@ -0,0 +1,200 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("restaurant-tool-cache")
+
+_NON_WORD = re.compile(r"[^a-z0-9 ]")
+
+# Default location of the persisted semantic cache (set SEMANTIC_CACHE_DB="" to keep it in memory only)
+DEFAULT_SEMANTIC_CACHE_DB = os.path.join(os.path.dirname(__file__), '..', '..', '.semantic_cache.sqlite3')
+
+def ttl_cached(ttl: int = 3600, maxsize: int = 256, cache_if: Optional[Callable[[str], bool]] = None):
+    """
+    Cache the result of a single-argument informational tool for `ttl` seconds.
+
+    The cache key is the argument lowercased with punctuation and repeated
+    whitespace removed, so "What are your hours?" and "what are your hours"
+    share an entry. With `cache_if`, only results it accepts are kept, so
+    fallback replies sent while a backend is down are not replayed after it
+    recovers. Only use this for read-only tools (FAQ, menu search) - never
+    for booking/cancel tools.
+    """
+    def decorator(func):
+        cache: dict[str, tuple[float, str]] = {}
+        # Tools run in asyncio.to_thread workers, so lookups and evictions are serialized
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            value = args[0] if args else next(iter(kwargs.values()), "")
+            key = " ".join(_NON_WORD.sub(" ", str(value).lower()).split())
+            now = time.monotonic()
+
+            with lock:
+                hit = cache.get(key)
+            if hit and now - hit[0] < ttl:
+                return hit[1]
+
+            result = func(*args, **kwargs)
+            if cache_if is not None and not cache_if(result):
+                return result
+
+            with lock:
+                # Evict the oldest entry when full
+                if key not in cache and len(cache) >= maxsize:
+                    cache.pop(next(iter(cache)))
+                cache[key] = (now, result)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+class SemanticSearchCache:
+    """
+    Reuse vectorstore search results for paraphrased queries.
+
+    Each query is embedded once; if a previous query's embedding has cosine
+    similarity >= `threshold` its joined chunk text is returned, otherwise the
+    store is searched by the same vector and the result is remembered (oldest
+    entry overwritten once `maxsize` is reached).
+
+    With a `namespace`, entries are also written to a sqlite table (path from
+    SEMANTIC_CACHE_DB) and reloaded on first use, so common questions are still
+    cached after a restart. Entries older than `ttl` seconds (SEMANTIC_CACHE_TTL,
+    default one day) are ignored and pruned.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 512, namespace: Optional[str] = None,
+                 ttl: Optional[float] = None, db_path: Optional[str] = None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.namespace = namespace
+        if namespace:
+            ttl = ttl if ttl is not None else float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+            db_path = db_path if db_path is not None else os.getenv("SEMANTIC_CACHE_DB", DEFAULT_SEMANTIC_CACHE_DB)
+        self.ttl = ttl
+        self._db_path = db_path if namespace else None
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self._vectors: Optional[np.ndarray] = None
+        self._created: Optional[np.ndarray] = None
+        self._results: list[str] = []
+        self._next = 0
+        self._loaded = not self._db_path
+
+    def clear(self) -> None:
+        """Forget every cached search (e.g. after the vectorstore is rebuilt)"""
+        with self._lock:
+            self._reset()
+            self._execute("DELETE FROM semantic_cache WHERE namespace = ?", (self.namespace,))
+
+    def search(self, store, query: str, k: int, max_distance: Optional[float] = None, mmr_fetch_k: Optional[int] = None) -> str:
+        """
+        Return the top-k chunks for `query` joined by blank lines ("" if none).
+
+        Chunks farther than `max_distance` (the collection's distance metric)
+        are dropped, so off-topic queries fall back instead of returning the
+        nearest irrelevant chunks. With `mmr_fetch_k`, k diverse chunks are
+        picked from that many candidates by maximal marginal relevance.
+        """
+        vector = np.asarray(store.embeddings.embed_query(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock:
+            if not self._loaded:
+                self._load(vector.shape[0])
+            if self._results and self._vectors.shape[1] == vector.shape[0]:
+                sims = self._vectors[:len(self._results)] @ vector
+                if self.ttl:
+                    sims[self._created[:len(self._results)] < time.time() - self.ttl] = -1.0
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    return self._results[best]
+
+        if mmr_fetch_k:
+            docs = store.max_marginal_relevance_search_by_vector(vector.tolist(), k=k, fetch_k=mmr_fetch_k, lambda_mult=0.5)
+        elif max_distance is not None:
+            scored = store.similarity_search_by_vector_with_relevance_scores(vector.tolist(), k=k)
+            docs = [doc for doc, distance in scored if distance <= max_distance]
+        else:
+            docs = store.similarity_search_by_vector(vector.tolist(), k=k)
+        content = "\n\n".join(doc.page_content for doc in docs)
+        if content:
+            self._remember(vector, content)
+        return content
+
+    def _remember(self, vector: np.ndarray, content: str) -> None:
+        created = time.time()
+        with self._lock:
+            self._store(vector, content, created)
+            self._execute(
+                "INSERT INTO semantic_cache (namespace, embedding, response, created_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, vector.tobytes(), content, created)
+            )
+
+    def _store(self, vector: np.ndarray, content: str, created: float) -> None:
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            self._vectors = np.empty((self.maxsize, vector.shape[0]), dtype=np.float32)
+            self._created = np.empty(self.maxsize, dtype=np.float64)
+            self._results = []
+            self._next = 0
+        self._vectors[self._next] = vector
+        self._created[self._next] = created
+        if self._next < len(self._results):
+            self._results[self._next] = content
+        else:
+            self._results.append(content)
+        self._next = (self._next + 1) % self.maxsize
+
+    def _load(self, dimensions: int) -> None:
+        """Fill the in-memory cache with this namespace's unexpired persisted entries"""
+        self._loaded = True
+        cutoff = time.time() - self.ttl if self.ttl else 0.0
+        self._execute("DELETE FROM semantic_cache WHERE namespace = ? AND created_at < ?", (self.namespace, cutoff))
+        rows = self._execute(
+            "SELECT embedding, response, created_at FROM semantic_cache "
+            "WHERE namespace = ? ORDER BY created_at DESC LIMIT ?",
+            (self.namespace, self.maxsize)
+        )
+        # Oldest first, so the ring buffer overwrites them first; skip vectors from another embedding size
+        for embedding, response, created in reversed(rows):
+            vector = np.frombuffer(embedding, dtype=np.float32)
+            if vector.shape[0] == dimensions:
+                self._store(vector, response, created)
+
+    def _execute(self, sql: str, params: tuple) -> list:
+        """Run one statement against the persisted cache; failures disable persistence instead of the tool"""
+        if not self._db_path:
+            return []
+        try:
+            if self._db is None:
+                self._db = sqlite3.connect(self._db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                    "namespace TEXT NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS semantic_cache_namespace ON semantic_cache (namespace, created_at)")
+            with self._db:
+                return self._db.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Persistent semantic cache disabled ({self.namespace}): {str(e)}")
+            self._db_path = None
+            return []
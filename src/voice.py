@@ -1,33 +1,40 @@
+import asyncio
 import logging
+import operator
 import os
+import random
 import re
 from dataclasses import dataclass, field
-from typing import Annotated, Optional, Any, Any
-from datetime import datetime
+from functools import lru_cache
+from typing import Annotated, Optional, Any
+from datetime import datetime, timedelta, timezone
+from time import monotonic
 from livekit import rtc
 
+import httpx
+import orjson
+
 
-import yaml
 from dotenv import load_dotenv
 from pydantic import Field
 
-from livekit.agents import metrics, MetricsCollectedEvent
-from livekit.agents import JobContext, WorkerOptions, cli, metrics
-from livekit.agents.llm import function_tool
+from livekit.agents import metrics, MetricsCollectedEvent, UserInputTranscribedEvent
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli, metrics
+from livekit.agents.llm import function_tool, utils as llm_utils
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.agents.voice.room_io import RoomInputOptions
 from livekit.plugins import cartesia, deepgram, openai, silero, elevenlabs, noise_cancellation
 
 # Import your custom RAG tools
 from tools.faq import restaurant_faq
-from tools.book_table import book_table
+from tools.book_table import BOOKING_CONFIRMED, book_table
 from tools.modify_reservation import modify_reservation
 from tools.cancel_reservation import cancel_reservation, view_reservation
 from tools.check_availability import check_table_availability
 from tools.menu_search import menu_search, menu_recommendations
 
 # Import database for connection testing
-from db import supabase
+from db import insert_rows, supabase
 
 # Import CRM functionality
 from crm import crm_manager, store_customer_info, add_interaction_note, get_customer_by_phone
@@ -38,74 +45,162 @@ logger.setLevel(logging.INFO)
 # Load environment variables from the correct path
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
+# LiveKit rebuilds a pydantic model and strict JSON schema for every tool on every LLM
+# request; the tools below never change, so each schema is built once per process
+_build_strict_openai_schema = llm_utils.build_strict_openai_schema
+_tool_schemas: dict[int, tuple[Any, dict]] = {}
+
+def _cached_strict_openai_schema(function_tool) -> dict:
+    cached = _tool_schemas.get(id(function_tool))
+    if cached is None or cached[0] is not function_tool:
+        cached = _tool_schemas[id(function_tool)] = (function_tool, _build_strict_openai_schema(function_tool))
+    return cached[1]
+
+llm_utils.build_strict_openai_schema = _cached_strict_openai_schema
+
+# Phone number patterns, compiled once at import
+_RE_NON_PHONE_CHARS = re.compile(r'[^\d+]')
+# Deletes every ASCII character except digits and '+' (non-ASCII input falls back to the regex)
+_PHONE_DELETE_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(128) if chr(c) not in '0123456789+'))
+# Matches: +15551234567, +1-555-123-4567, (555) 123-4567, etc.
+_PHONE_PATTERNS = (
+    #re.compile(r'\+?1?[-.\s]?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})'),  # US numbers
+    re.compile(r'\+([0-9]{10,15})'),  # International numbers with +
+    re.compile(r'([0-9]{10,11})'),    # 10-11 digit numbers
+)
+
+# Final user utterances that look like menu or FAQ questions are searched speculatively
+# while the LLM is still deciding which tool to call (first matching category wins)
+_PREFETCH_PATTERNS = (
+    ("menu", re.compile(r'\b(menu|dish(es)?|food|eat|vegetarian|vegan|gluten|desserts?|drinks?|wine|cocktails?|specials?)\b', re.IGNORECASE)),
+    ("faq", re.compile(r'\b(hours|open|close|parking|address|located|location|dress|attire|payment|policy)\b', re.IGNORECASE)),
+)
+_RE_WORDS = re.compile(r"[a-z0-9']+")
+
+@dataclass(frozen=True, slots=True)
+class ModelPrice:
+    """Per-million-token LLM pricing (adjust rates for your provider)"""
+    input_per_million: float
+    cached_input_per_million: float
+    output_per_million: float
+
+    def cost_for(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """Dollar cost of a call; `input_tokens` excludes the cached ones, which bill at the discounted rate"""
+        return (input_tokens * self.input_per_million
+                + cached_tokens * self.cached_input_per_million
+                + output_tokens * self.output_per_million) / 1_000_000
+
+@dataclass(slots=True)
+class CallRow:
+    """One row of the Supabase calls table (orjson serializes it directly)"""
+    client_id: Optional[str]  # Caller's phone number when known
+    caller: str
+    start_time: str
+    end_time: str
+    duration: float
+    status: str
+    booking_made: bool
+    llm_tokens_input: int
+    llm_tokens_output: int
+    stt_seconds: float
+    tts_characters: int
+    estimated_cost: float
+    transcript: str = ""  # No longer storing transcripts
+
+# UsageSummary fields read when the call is logged, in unpacking order
+_USAGE_FIELDS = operator.attrgetter(
+    'llm_prompt_tokens', 'llm_prompt_cached_tokens', 'llm_completion_tokens',
+    'tts_characters_count', 'tts_audio_duration', 'stt_audio_duration'
+)
+
+# OpenAI GPT-4o-mini: $0.15 per 1M input ($0.075 cached), $0.60 per 1M output tokens
+_LLM_PRICE = ModelPrice(input_per_million=0.15, cached_input_per_million=0.075, output_per_million=0.60)
+# Deepgram STT: ~$0.0043 per minute
+_STT_PER_SEC = 0.0043 / 60
+# OpenAI TTS: estimated rate for calculation
+_TTS_PER_CHAR = 0.30 / 1000
+
+# Call-log inserts are retried with exponential backoff; rows that still fail are appended
+# to a JSON-lines file that `python db.py backfill-calls <file>` can replay
+CALL_LOG_ATTEMPTS = 4
+FAILED_CALLS_PATH = os.getenv("FAILED_CALLS_PATH", os.path.join(os.path.dirname(__file__), '..', 'failed_calls.jsonl'))
+
+def _is_transient(error: Exception) -> bool:
+    """Network errors, rate limits and 5xx responses are worth retrying; other rejections are not"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError))
+
+async def push_call_log(row: CallRow) -> bool:
+    """Insert one call-log row, retrying transient failures; returns False if it was dead-lettered"""
+    for attempt in range(CALL_LOG_ATTEMPTS):
+        try:
+            # The insert is blocking; run it in a thread so the loop can finish shutting down
+            await asyncio.to_thread(insert_rows, "calls", [row])
+            return True
+        except Exception as e:
+            if attempt + 1 == CALL_LOG_ATTEMPTS or not _is_transient(e):
+                logger.error(f"[ERROR] Failed to log call data: {str(e)}")
+                break
+            delay = 0.5 * 2 ** attempt
+            logger.warning(f"Call log insert failed ({str(e)}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    try:
+        with open(FAILED_CALLS_PATH, "ab") as f:
+            f.write(orjson.dumps(row) + b"\n")
+        logger.warning(f"Call log saved to {FAILED_CALLS_PATH} for replay")
+    except OSError as e:
+        logger.error(f"[ERROR] Failed to save call log for replay: {str(e)}")
+    return False
+
+def _strip_phone(text: str) -> str:
+    """Drop everything but digits and '+' in one C-level pass (regex for non-ASCII input)"""
+    return text.translate(_PHONE_DELETE_TABLE) if text.isascii() else _RE_NON_PHONE_CHARS.sub('', text)
+
 def clean_phone_number(phone: str) -> Optional[str]:
     """Clean and validate phone number format."""
-    import re
-    
     if not phone:
         return None
     
     # Remove all non-digit characters except + at the beginning
-    cleaned = re.sub(r'[^\d+]', '', phone)
-    
-    # If it's already a properly formatted international number, return as-is
-    if cleaned.startswith('+') and len(cleaned) >= 11:  # +X and at least 10 digits
-        # Validate that it's a reasonable phone number length (10-15 digits after +)
-        digits_after_plus = cleaned[1:]
-        if len(digits_after_plus) >= 10 and len(digits_after_plus) <= 15:
+    cleaned = _strip_phone(phone)
+    if '+' in cleaned[1:]:
+        cleaned = cleaned[0] + cleaned[1:].replace('+', '')
+    
+    # One dispatch on the leading character and length; the first matching case wins
+    match cleaned[:1], len(cleaned):
+        case '+', length if length >= 10:
+            # Already international (+ and at least 9 digits), keep as-is
             return cleaned
-    
-    # Handle US numbers specifically
-    if cleaned.startswith('+1'):
-        # US number with country code +1
-        digits = cleaned[2:]
-        if len(digits) == 10:
-            return cleaned  # Already properly formatted
-    elif cleaned.startswith('1') and len(cleaned) == 11:
-        # US number starting with 1 but missing +
-        return f"+{cleaned}"
-    elif len(cleaned) == 10:
-        # 10-digit US number without country code
-        return f"+1{cleaned}"
-    
-    # For other cases, if it starts with + and has reasonable length, keep it
-    if cleaned.startswith('+') and len(cleaned) >= 10:
-        return cleaned
-    
-    # If it doesn't start with + but has reasonable length, it might be international
-    if len(cleaned) >= 10 and len(cleaned) <= 15 and not cleaned.startswith('1'):
-        return f"+{cleaned}"
+        case '1', 11:
+            # US number starting with 1 but missing +
+            return f"+{cleaned}"
+        case _, 10:
+            # 10-digit US number without country code
+            return f"+1{cleaned}"
+        case first, length if 11 <= length <= 15 and first != '1':
+            # Doesn't start with + but has reasonable length, it might be international
+            return f"+{cleaned}"
     
     return None
 
+@lru_cache(maxsize=1024)
 def extract_phone_from_caller_id(caller_id: str) -> Optional[str]:
-    """Extract phone number from LiveKit caller ID/room name if available."""
+    """Extract phone number from LiveKit caller ID/room name if available (cached per caller ID)."""
     if not caller_id:
         return None
     
     # Remove common prefixes and clean the string
     cleaned = caller_id.strip()
     
-    # Try to extract phone number using regex patterns
-    import re
-    
-    # Pattern 1: Look for phone number patterns in the string
-    # Matches: +15551234567, +1-555-123-4567, (555) 123-4567, etc.
-    phone_patterns = [
-        #r'\+?1?[-.\s]?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})',  # US numbers
-        r'\+([0-9]{10,15})',  # International numbers with +
-        r'([0-9]{10,11})',    # 10-11 digit numbers
-    ]
-    
-    for pattern in phone_patterns:
-        matches = re.findall(pattern, cleaned)
-        if matches:
-            if isinstance(matches[0], tuple):
-                # For grouped matches (area code, exchange, number)
-                phone_digits = ''.join(matches[0])
-            else:
-                # For single group matches
-                phone_digits = matches[0]
+    # Look for phone number patterns in the string
+    for pattern in _PHONE_PATTERNS:
+        # Only the first match is used, so stop scanning there
+        match = pattern.search(cleaned)
+        if match:
+            # Join the groups (area code, exchange, number for grouped patterns)
+            phone_digits = ''.join(match.groups())
             
             # Try to clean and validate the extracted digits
             potential_phone = clean_phone_number(phone_digits)
@@ -113,18 +208,27 @@ def extract_phone_from_caller_id(caller_id: str) -> Optional[str]:
                 logger.info(f"📞 Extracted phone from '{caller_id}': {potential_phone}")
                 return potential_phone
     
-    # Fallback: Check if the entire caller_id looks like a phone number
-    if caller_id and caller_id.startswith(('+', '1')) and len(caller_id.replace('+', '').replace('-', '').replace(' ', '')) >= 10:
-        return clean_phone_number(caller_id)
+    # Fallback: Check if the entire caller_id looks like a phone number (at least 10 digits)
+    if caller_id[:1] in ('+', '1'):
+        stripped = _strip_phone(caller_id)
+        if len(stripped) - stripped.count('+') >= 10:
+            return clean_phone_number(caller_id)
     
     # If no phone pattern found, return None
     return None
 
+# Set once the connection test passes; later calls in this worker process skip the round-trip
+_database_connection_ok = False
+
 def test_database_connection():
-    """Test database connection at startup"""
+    """Test database connection at startup (once per worker process after the first success)"""
+    global _database_connection_ok
+    if _database_connection_ok:
+        return True
     try:
         result = supabase.table("bookings").select("*").limit(1).execute()
         logger.info("[SUCCESS] Database connection successful")
+        _database_connection_ok = True
         return True
     except Exception as e:
         logger.error(f"[ERROR] Database connection failed: {str(e)}")
@@ -148,22 +252,30 @@ class RestaurantUserData:
     pending_booking: Optional[dict] = None
     conversation_context: Optional[str] = None
     
+    # CRM contact row for customer_phone as last read or written this session
+    crm_record: Optional[dict] = None
+    # Latest background CRM write; each write waits for the previous one so they land in order
+    crm_write: Optional[asyncio.Task] = None
+    
     # Session tracking
     room_name: Optional[str] = None
     conversation_summary: Optional[str] = None
     
     agents: dict[str, Agent] = field(default_factory=dict)
     prev_agent: Optional[Agent] = None
+    
+    # Speculative RAG search for the latest utterance: category -> (utterance words, search task)
+    rag_prefetch: dict[str, tuple[frozenset[str], asyncio.Task]] = field(default_factory=dict)
 
     def summarize(self) -> str:
-        data = {
-            "customer_name": self.customer_name or "not provided",
-            "customer_phone": self.customer_phone or "not provided", 
-            "current_reservation_id": self.current_reservation_id or "none",
-            "pending_booking": self.pending_booking or "none",
-            "conversation_context": self.conversation_context or "general inquiry"
-        }
-        return yaml.dump(data)
+        """Plain "key: value" lines describing the session for the LLM context"""
+        return (
+            f"customer_name: {self.customer_name or 'not provided'}\n"
+            f"customer_phone: {self.customer_phone or 'not provided'}\n"
+            f"current_reservation_id: {self.current_reservation_id or 'none'}\n"
+            f"pending_booking: {self.pending_booking or 'none'}\n"
+            f"conversation_context: {self.conversation_context or 'general inquiry'}\n"
+        )
 
     def get_contact_info(self) -> dict[str, Optional[str]]:
         """Get complete contact information for the customer."""
@@ -174,6 +286,85 @@ class RestaurantUserData:
 
 RunContext_T = RunContext[RestaurantUserData]
 
+def prefetch_rag(userdata: RestaurantUserData, transcript: str) -> None:
+    """Start a menu or FAQ search for a final user transcript that looks like one"""
+    userdata.rag_prefetch = {}
+    for category, pattern in _PREFETCH_PATTERNS:
+        if pattern.search(transcript):
+            tool = menu_search if category == "menu" else restaurant_faq
+            arg = "query" if category == "menu" else "question"
+            task = asyncio.create_task(asyncio.to_thread(tool.invoke, {arg: transcript}))
+            userdata.rag_prefetch[category] = (frozenset(_RE_WORDS.findall(transcript.lower())), task)
+            return
+
+async def take_prefetched_rag(userdata: RestaurantUserData, category: str, query: str) -> Optional[str]:
+    """Return the speculative search result if the tool query only uses words the caller said"""
+    words, task = userdata.rag_prefetch.pop(category, (frozenset(), None))
+    if task is None or not set(_RE_WORDS.findall(query.lower())) <= words:
+        return None
+    try:
+        return await task
+    except Exception as e:
+        logger.warning(f"RAG prefetch failed: {str(e)}")
+        return None
+
+def schedule_crm_write(userdata: RestaurantUserData, action: str, **customer) -> None:
+    """Store customer info in the background so the spoken reply doesn't wait for Supabase"""
+    previous = userdata.crm_write
+
+    async def write():
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        # The CRM runs its Supabase queries in worker threads, so audio keeps flowing meanwhile
+        return await store_customer_info(**customer)
+
+    def finished(task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        result = {} if error else task.result()
+        if result.get("success"):
+            userdata.crm_record = result.get("data")
+            logger.info(f"Updated CRM with {action}")
+        else:
+            # Forget the record so the next update isn't skipped against stale data
+            userdata.crm_record = None
+            logger.error(f"Failed to update CRM with {action}: {str(error or result.get('error'))}")
+
+    userdata.crm_write = asyncio.create_task(write())
+    userdata.crm_write.add_done_callback(finished)
+
+# Stock filler phrases spoken while tools run, synthesized once per worker process
+_filler_audio: dict[str, list[rtc.AudioFrame]] = {}
+# Running synthesis tasks (held here so they aren't garbage-collected mid-flight)
+_filler_pending: dict[str, asyncio.Task] = {}
+
+async def _synthesize_filler(tts, text: str) -> None:
+    """Cache the audio frames for a filler phrase"""
+    try:
+        async with tts.synthesize(text) as stream:
+            _filler_audio[text] = [audio.frame async for audio in stream]
+    except Exception as e:
+        logger.warning(f"Failed to cache filler audio for '{text}': {str(e)}")
+    finally:
+        _filler_pending.pop(text, None)
+
+async def _replay(frames: list[rtc.AudioFrame]):
+    for frame in frames:
+        yield frame
+
+async def say_filler(session: AgentSession, text: str) -> None:
+    """Speak a constant filler phrase, replaying cached audio instead of calling TTS again"""
+    frames = _filler_audio.get(text)
+    if frames:
+        await session.say(text, audio=_replay(frames))
+        return
+    
+    # First use in this process: speak it normally and cache the audio in the background
+    if text not in _filler_pending and session.tts:
+        _filler_pending[text] = asyncio.create_task(_synthesize_filler(session.tts, text))
+    await session.say(text)
+
 # Common utility functions for LiveKit integration
 @function_tool()
 async def update_customer_name(
@@ -184,16 +375,13 @@ async def update_customer_name(
     userdata = context.userdata
     userdata.customer_name = name
     
-    # Update CRM with customer name if we have a phone number
-    if userdata.customer_phone:
-        try:
-            await store_customer_info(
-                phone=userdata.customer_phone,
-                name=name
-            )
-            logger.info(f"Updated CRM with customer name: {name} (phone: {userdata.customer_phone})")
-        except Exception as e:
-            logger.error(f"Failed to update CRM with name: {str(e)}")
+    # Update CRM with customer name if we have a phone number (and it isn't already stored)
+    if userdata.customer_phone and (userdata.crm_record or {}).get("name") != name:
+        schedule_crm_write(
+            userdata, f"customer name: {name} (phone: {userdata.customer_phone})",
+            phone=userdata.customer_phone,
+            name=name
+        )
     
     return f"Great! I've recorded your name as {name}."
 
@@ -212,15 +400,14 @@ async def update_customer_phone(
     
     userdata.customer_phone = cleaned_phone
     
-    # Update CRM with phone number as primary key
-    try:
-        await store_customer_info(
+    # Update CRM with phone number as primary key, unless this contact is already stored as-is
+    record = userdata.crm_record or {}
+    if record.get("phone") != cleaned_phone or (userdata.customer_name and record.get("name") != userdata.customer_name):
+        schedule_crm_write(
+            userdata, f"phone number: {cleaned_phone}",
             phone=cleaned_phone,
             name=userdata.customer_name
         )
-        logger.info(f"Updated CRM with phone number: {cleaned_phone}")
-    except Exception as e:
-        logger.error(f"Failed to update CRM with phone: {str(e)}")
     
     return f"Perfect! I've recorded your phone number as {cleaned_phone}. This will help us contact you if needed."
 
@@ -262,13 +449,13 @@ async def voice_book_table(
         else:
             logger.info("📞 No phone number available for booking")
         
-        result = book_table.invoke(booking_data)
+        result = await asyncio.to_thread(book_table.invoke, booking_data)
 
         
         logger.info(f"✅ Booking completed: {result[:100]}...")
         
         # Update user data if booking successful
-        if "successfully" in result.lower() or "confirmed" in result.lower():
+        if result.startswith(BOOKING_CONFIRMED):
             userdata = context.userdata
             userdata.customer_name = name
             userdata.pending_booking = {
@@ -312,13 +499,11 @@ async def voice_check_availability(
 
     try:
         # Use invoke method for LangChain tools
-        input_data: dict[str, Any] = {"date": date}
-        if time is not None:
-            input_data["time"] = time
-        if party_size is not None:
-            input_data["party_size"] = party_size
+        input_data: dict[str, Any] = {
+            k: v for k, v in (("date", date), ("time", time), ("party_size", party_size)) if v is not None
+        }
             
-        result = check_table_availability.invoke(input_data)
+        result = await asyncio.to_thread(check_table_availability.invoke, input_data)
         logger.info(f"✅ Availability check completed")
         return result
     except Exception as e:
@@ -338,10 +523,10 @@ async def voice_menu_search(
     userdata.conversation_context = f"Menu search: {query}"
     
     # Provide immediate feedback using the session's say method
-    await context.session.say("Emmm, I'm looking through our menu...")
+    await say_filler(context.session, "Emmm, I'm looking through our menu...")
     
     try:
-        result = menu_search.invoke({"query": query})
+        result = await take_prefetched_rag(userdata, "menu", query) or await asyncio.to_thread(menu_search.invoke, {"query": query})
         logger.info(f"✅ Menu search completed")
         return result
     except Exception as e:
@@ -359,10 +544,10 @@ async def voice_menu_recommendations(
     userdata.conversation_context = f"Menu recommendations: {preferences}"
     
     # Provide immediate feedback using the session's say method
-    await context.session.say("Let me find some recommendations for you...")
+    await say_filler(context.session, "Let me find some recommendations for you...")
     
     try:
-        result = menu_recommendations.invoke({"preferences": preferences})
+        result = await asyncio.to_thread(menu_recommendations.invoke, {"preferences": preferences})
         return result
     except Exception as e:
         logger.error(f"Error getting recommendations: {str(e)}")
@@ -378,9 +563,9 @@ async def voice_restaurant_faq(
     userdata = context.userdata
     userdata.conversation_context = f"FAQ: {question}"
     
-    await context.session.say("Let me find that information for you...")
+    await say_filler(context.session, "Let me find that information for you...")
     try:
-        result = restaurant_faq.invoke({"question": question})
+        result = await take_prefetched_rag(userdata, "faq", question) or await asyncio.to_thread(restaurant_faq.invoke, {"question": question})
         return result
     except Exception as e:
         logger.error(f"Error answering FAQ: {str(e)}")
@@ -392,9 +577,9 @@ async def voice_view_reservation(
     context: RunContext_T,
 ) -> str:
     """View details of an existing reservation."""
-    await context.session.say("Let me check the details of your reservation...")
+    await say_filler(context.session, "Let me check the details of your reservation...")
     try:
-        result = view_reservation.invoke({"reservation_id": reservation_id})
+        result = await asyncio.to_thread(view_reservation.invoke, {"reservation_id": reservation_id})
         userdata = context.userdata
         userdata.current_reservation_id = reservation_id
         return result
@@ -412,19 +597,16 @@ async def voice_modify_reservation(
     party_size: Annotated[Optional[int], Field(description="New party size")] = None,
 ) -> str:
     """Modify an existing reservation."""
-    await context.session.say("I'm processing your request...")
+    await say_filler(context.session, "I'm processing your request...")
     try:
-        input_data: dict[str, Any] = {"reservation_id": reservation_id}
-        if name is not None:
-            input_data["name"] = name
-        if date is not None:
-            input_data["date"] = date
-        if time is not None:
-            input_data["time"] = time
-        if party_size is not None:
-            input_data["party_size"] = party_size
+        input_data: dict[str, Any] = {
+            k: v for k, v in (
+                ("reservation_id", reservation_id), ("name", name), ("date", date),
+                ("time", time), ("party_size", party_size)
+            ) if v is not None
+        }
             
-        result = modify_reservation.invoke(input_data)
+        result = await asyncio.to_thread(modify_reservation.invoke, input_data)
         return result
     except Exception as e:
         logger.error(f"Error modifying reservation: {str(e)}")
@@ -437,13 +619,13 @@ async def voice_cancel_reservation(
     reason: Annotated[Optional[str], Field(description="Reason for cancellation")] = None,
 ) -> str:
     """Cancel an existing reservation."""
-    await context.session.say("I'm processing your cancellation request...")
+    await say_filler(context.session, "I'm processing your cancellation request...")
     try:
-        input_data: dict[str, Any] = {"reservation_id": reservation_id}
-        if reason is not None:
-            input_data["reason"] = reason
+        input_data: dict[str, Any] = {
+            k: v for k, v in (("reservation_id", reservation_id), ("reason", reason)) if v is not None
+        }
             
-        result = cancel_reservation.invoke(input_data)
+        result = await asyncio.to_thread(cancel_reservation.invoke, input_data)
         
         # Add CRM note about cancellation
         userdata = context.userdata
@@ -496,15 +678,7 @@ class RestaurantVoiceAgent(Agent):
                 "Try to win time by making small talk to avoid dead air. "
                 "When ending calls, simply say goodbye without summarizing the entire conversation."
             ),
-            llm=openai.LLM(
-                model="gpt-4o-mini",
-                parallel_tool_calls=True,  # Enable parallel tool calls for faster processing
-            ),
-            tts = openai.TTS(
-                model="gpt-4o-mini-tts",
-                voice="ash",
-                instructions="Speak in a friendly and conversational tone.",
-            ),
+            # LLM and TTS come from the AgentSession (see entrypoint)
             tools=[
                 voice_book_table,
                 voice_check_availability, 
@@ -532,10 +706,11 @@ class RestaurantVoiceAgent(Agent):
         else:
             logger.info("📞 Agent started without phone number")
         
-        # Initialize caller tracking
-        await self._initialize_caller_tracking(userdata)
-        
+        # Initialize caller tracking while the chat context is copied; the summary
+        # below needs the CRM name, so it waits for the lookup to finish
+        caller_tracking = asyncio.create_task(self._initialize_caller_tracking(userdata))
         chat_ctx = self.chat_ctx.copy()
+        await caller_tracking
 
         # Add context about the current user data
         if userdata:
@@ -551,9 +726,11 @@ class RestaurantVoiceAgent(Agent):
         try:
             # Check if this customer exists in CRM (only if we have a phone)
             if userdata.customer_phone:
-                existing_customer = get_customer_by_phone(userdata.customer_phone)
+                # The Supabase client is blocking; keep the event loop free for audio
+                existing_customer = await asyncio.to_thread(get_customer_by_phone, userdata.customer_phone)
                 if existing_customer:
                     logger.info(f"Found existing customer for phone {userdata.customer_phone}")
+                    userdata.crm_record = existing_customer
                     
                     # Pre-populate known information
                     if existing_customer.get('name') and not userdata.customer_name:
@@ -569,34 +746,25 @@ class RestaurantVoiceAgent(Agent):
 
     def _generate_conversation_summary(self, userdata: RestaurantUserData) -> str:
         """Generate a meaningful conversation summary based on user interactions"""
-        summary_parts = []
-        
-        # Add customer name if available
-        if userdata.customer_name:
-            summary_parts.append(f"Customer: {userdata.customer_name}")
-        
-        # Add booking information if available
-        if userdata.pending_booking:
-            booking = userdata.pending_booking
-            if booking.get("status") == "confirmed":
-                booking_info = f"Booked table for {booking.get('party_size', 'N/A')} people on {booking.get('date', 'N/A')} at {booking.get('time', 'N/A')}"
-                summary_parts.append(booking_info)
-            else:
-                summary_parts.append("Discussed table booking (not confirmed)")
-        
-        # Add reservation management if applicable
-        if userdata.current_reservation_id:
-            summary_parts.append(f"Managed reservation #{userdata.current_reservation_id}")
+        booking = userdata.pending_booking
+        if booking:
+            booking_info = (
+                f"Booked table for {booking.get('party_size', 'N/A')} people on {booking.get('date', 'N/A')} at {booking.get('time', 'N/A')}"
+                if booking.get("status") == "confirmed" else "Discussed table booking (not confirmed)"
+            )
+        else:
+            booking_info = None
         
-        # Add conversation context if available
-        if userdata.conversation_context:
-            summary_parts.append(f"Topic: {userdata.conversation_context}")
+        # Customer, booking, reservation management and topic, in one join (missing parts are skipped)
+        summary = "; ".join(filter(None, [
+            f"Customer: {userdata.customer_name}" if userdata.customer_name else None,
+            booking_info,
+            f"Managed reservation #{userdata.current_reservation_id}" if userdata.current_reservation_id else None,
+            f"Topic: {userdata.conversation_context}" if userdata.conversation_context else None,
+        ]))
         
         # Default summary if no specific actions
-        if not summary_parts:
-            summary_parts.append("General inquiry call")
-        
-        return "; ".join(summary_parts)
+        return summary or "General inquiry call"
 
     async def on_user_speech_transcript(self, transcript: str) -> None:
         """Called when user speech is transcribed - no longer storing transcripts"""
@@ -619,7 +787,14 @@ class RestaurantVoiceAgent(Agent):
                 # Try to extract phone from room name one more time
                 phone_to_use = extract_phone_from_caller_id(userdata.room_name)
             
+            # Let background CRM writes land before the final update
+            if userdata.crm_write:
+                await asyncio.gather(userdata.crm_write, return_exceptions=True)
+            
             if phone_to_use:
+                # Write any debounced interaction notes before the final update
+                await crm_manager.flush_pending_notes(phone_to_use)
+                
                 # Generate meaningful conversation summary
                 conversation_summary = self._generate_conversation_summary(userdata)
                 
@@ -642,6 +817,10 @@ class RestaurantVoiceAgent(Agent):
 
 
 
+def prewarm(proc: JobProcess):
+    """Load the VAD model once per worker process instead of on every call"""
+    proc.userdata["vad"] = silero.VAD.load()
+
 async def entrypoint(ctx: JobContext):
     """Main entry point for the restaurant voice agent"""
     
@@ -651,7 +830,10 @@ async def entrypoint(ctx: JobContext):
         raise Exception("Database connection failed")
     
     # Track call start time and initialize usage collector
-    call_start = datetime.now()
+    # UTC so PostgREST gets unambiguous ISO strings; duration is measured on the monotonic clock
+    call_start = datetime.now(timezone.utc)
+    call_start_iso = call_start.isoformat()
+    call_start_monotonic = monotonic()
     caller_info = ctx.room.name if ctx.room else "Unknown"
     usage_collector = metrics.UsageCollector()
 
@@ -682,13 +864,16 @@ async def entrypoint(ctx: JobContext):
         stt = deepgram.STT(
             model="nova-3",
         ),  # Use Deepgram STT provider
-        llm=openai.LLM(model="gpt-4o-mini"),
+        llm=openai.LLM(
+            model="gpt-4o-mini",
+            parallel_tool_calls=True,  # Enable parallel tool calls for faster processing
+        ),
         tts = openai.TTS(
             model="gpt-4o-mini-tts",
             voice="ash",
             instructions="Speak in a friendly and conversational tone.",
         ),
-        vad=silero.VAD.load(),
+        vad=ctx.proc.userdata["vad"],
         max_tool_steps=5,  # Reduce tool steps to prevent long silences
     )
 
@@ -697,6 +882,73 @@ async def entrypoint(ctx: JobContext):
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         usage_collector.collect(ev.metrics)
 
+    # Start menu/FAQ searches as soon as the caller finishes speaking
+    @session.on("user_input_transcribed")
+    def _on_user_input_transcribed(ev: UserInputTranscribedEvent):
+        if ev.is_final and ev.transcript:
+            prefetch_rag(userdata, ev.transcript)
+
+    # The call is logged when the job shuts down (after the caller hangs up), not when
+    # the greeting finishes; call_status is read at that point
+    call_status = "answered"
+
+    async def log_call():
+        # Track call end time and collect usage metrics
+        duration = monotonic() - call_start_monotonic
+        # End time follows from the monotonic duration, so a wall-clock jump mid-call cannot skew it
+        call_end_iso = (call_start + timedelta(seconds=duration)).isoformat()
+
+        # Check if a booking was made during the call
+        booking_made = (userdata.pending_booking or {}).get("status") == "confirmed"
+
+        # Collect usage summary and calculate costs
+        try:
+            # One C-level fetch of every usage field; a missing field falls through to the zero defaults below
+            llm_in, llm_cached, llm_out, tts_chars, tts_duration, stt_duration = _USAGE_FIELDS(usage_collector.get_summary())
+            
+            # Estimate session cost; llm_in includes the cached prompt tokens, billed at the cached rate
+            total_cost = (
+                _LLM_PRICE.cost_for(llm_in - llm_cached, llm_out, llm_cached)
+                + stt_duration * _STT_PER_SEC
+                + tts_chars * _TTS_PER_CHAR
+            )
+            
+        except Exception as e:
+            logger.warning(f"Failed to collect usage metrics: {str(e)}")
+            # Set default values if metrics collection fails
+            llm_in = llm_out = llm_cached = 0
+            tts_chars = tts_duration = stt_duration = 0
+            total_cost = 0.0
+
+        # Hang-ups before the greeting and health-check dials leave nothing worth storing;
+        # failed sessions are still logged so they show up as canceled calls
+        if call_status == "answered" and not (llm_in or llm_out or stt_duration or tts_chars or booking_made):
+            logger.info(f"[CALL SKIPPED] No STT/LLM/TTS activity in {duration:.1f}s call from {caller_info}")
+            return
+
+        # Insert call data into Supabase with detailed usage metrics (no transcript)
+        try:
+            row = CallRow(
+                client_id=userdata.customer_phone, # Use phone as client ID if available
+                caller=caller_info,
+                start_time=call_start_iso,
+                end_time=call_end_iso,
+                duration=duration,
+                status=call_status,
+                booking_made=booking_made,
+                llm_tokens_input=llm_in,
+                llm_tokens_output=llm_out,
+                stt_seconds=round(stt_duration, 2),  # Match your table field name
+                tts_characters=tts_chars,
+                estimated_cost=round(total_cost, 4)
+            )
+            if await push_call_log(row):
+                logger.info(f"[CALL LOGGED] LLM: {llm_in}in/{llm_out}out tokens (cached: {llm_cached}), STT: {stt_duration:.1f}s, TTS: {tts_chars} chars/{tts_duration:.1f}s, Cost: ${total_cost:.4f}")
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to log call data: {str(e)}")
+
+    ctx.add_shutdown_callback(log_call)
+
     try:
         # Start the session
         await session.start(
@@ -720,73 +972,11 @@ async def entrypoint(ctx: JobContext):
     except Exception as e:
         logger.error(f"Session error: {str(e)}")
         call_status = "canceled"
-    else:
-        call_status = "answered"
-    finally:
-        # Track call end time and collect usage metrics
-        call_end = datetime.now()
-        duration = (call_end - call_start).total_seconds()
-
-        # Extract transcript from session/chat context
-        transcript_text = ""  # No longer capturing transcripts
-
-        # Check if a booking was made during the call
-        booking_made = (userdata.pending_booking or {}).get("status") == "confirmed"
-
-        # Collect usage summary and calculate costs
-        try:
-            summary = usage_collector.get_summary()
-            
-            # Extract usage metrics from UsageSummary object
-            llm_in = getattr(summary, 'llm_prompt_tokens', 0)
-            llm_cached = getattr(summary, 'llm_prompt_cached_tokens', 0)
-            llm_out = getattr(summary, 'llm_completion_tokens', 0)
-            tts_chars = getattr(summary, 'tts_characters_count', 0)
-            tts_duration = getattr(summary, 'tts_audio_duration', 0)
-            stt_duration = getattr(summary, 'stt_audio_duration', 0)
-            
-            # Estimate session cost (adjust rates for your providers)
-            # OpenAI GPT-4o-mini: ~$0.00015 per 1K input, ~$0.0006 per 1K output tokens
-            # Deepgram STT: ~$0.0043 per minute
-            # OpenAI TTS: estimated rate for calculation
-            llm_cost = (llm_in * 0.00015 + llm_out * 0.0006) / 1000
-            stt_cost = (stt_duration / 60) * 0.0043
-            tts_cost = (tts_chars / 1000) * 0.30
-            total_cost = llm_cost + stt_cost + tts_cost
-            
-        except Exception as e:
-            logger.warning(f"Failed to collect usage metrics: {str(e)}")
-            # Set default values if metrics collection fails
-            llm_in = llm_out = llm_cached = 0
-            tts_chars = tts_duration = stt_duration = 0
-            total_cost = 0.0
-
-        # Insert call data into Supabase with detailed usage metrics (no transcript)
-        try:
-            supabase.table("calls").insert({
-                "client_id": userdata.customer_phone, # Use phone as client ID if available
-                "caller": caller_info,
-                "start_time": call_start.isoformat(),
-                "end_time": call_end.isoformat(),
-                "duration": duration,
-                "status": call_status,
-                "booking_made": booking_made,
-                "transcript": "",  # No longer storing transcripts
-                "llm_tokens_input": llm_in,
-                "llm_tokens_output": llm_out,
-                "stt_seconds": round(stt_duration, 2),  # Match your table field name
-                "tts_characters": tts_chars,
-                "estimated_cost": round(total_cost, 4)
-            }).execute()
-            
-            logger.info(f"[CALL LOGGED] Call data with usage metrics pushed to Supabase")
-            logger.info(f"[USAGE] LLM: {llm_in}in/{llm_out}out tokens (cached: {llm_cached}), STT: {stt_duration:.1f}s, TTS: {tts_chars} chars/{tts_duration:.1f}s, Cost: ${total_cost:.4f}")
-        except Exception as e:
-            logger.error(f"[ERROR] Failed to log call data: {str(e)}")
 
 if __name__ == "__main__":
     cli.run_app(WorkerOptions(
         entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
 
         agent_name="my-telephony-agent"                    
     ))
\ No newline at end of file